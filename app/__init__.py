@@ -26,27 +26,53 @@ def create_app(config_class=Config):
     return app
 
 
+def start_roles(roles):
+    """Start what process roles need, nothing is started or fetched over network before this"""
+    if telegram_bot and 'bot' in roles:
+        if not asyncio.run(telegram_bot.test_token()):
+            app.logger.fatal('Telegram bot token is invalid')
+            exit()
+        telegram_bot.start()
+    if telegram_bot and 'web' in roles and app.config['SITE_URL']:
+        # Webhook updates come to web processes
+        telegram_bot.start_update_loop()
+
+    if 'poller' in roles:
+        if notifier:
+            notifier.start()
+        scheduler.start()
+
+
 app = create_app()
 
 if app.config['GITHUB_TOKEN']:
     auth = Auth.Token(app.config['GITHUB_TOKEN'])
 else:
     auth = None
-github_obj = Github(auth=auth)
+github_obj = Github(auth=auth, base_url=app.config['GITHUB_API_URL'], pool_size=app.config['POLL_CONCURRENCY'])
 
 if app.config['TELEGRAM_BOT_TOKEN']:
+    from app.notifier import Notifier
     from app.telegram_bot import TelegramBot
 
+    # Constructors only configure clients, start_roles() connects them
     telegram_bot = TelegramBot(app)
-    if not asyncio.run(telegram_bot.test_token()):
-        app.logger.fatal('Telegram bot token is invalid')
-        exit()
-    telegram_bot.start()
+    notifier = Notifier(app)
 else:
     telegram_bot = None
+    notifier = None
     app.logger.fatal('Telegram bot token not specified')
 
-scheduler.start()
+from app.lease_engine import Coordinator  # noqa: E402
+
+coordinator = Coordinator(app)
+
+from app import database, models  # noqa: E402
 
+if 'web' in app.config['ROLES']:
+    from app import routes  # noqa: E402
+if app.config['ROLES'] & {'web', 'poller'}:
+    # Webhooks store releases and queue notifications like the poller does
+    from app import tasks  # noqa: E402
 
-from app import database, models, routes, tasks  # noqa: E402
+start_roles(app.config['ROLES'])
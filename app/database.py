@@ -1,6 +1,13 @@
 import sqlite3
 
 from sqlalchemy import Engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+
+# INSERT ... ON CONFLICT, other databases fall back to a savepoint per row
+insert_dialects = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
 
 
 @event.listens_for(Engine, "connect")
@@ -0,0 +1,115 @@
+import json
+from datetime import datetime
+
+from app import app, github_obj
+from app.repo_engine import select_prerelease
+
+GRAPHQL_BATCH_SIZE = 100
+
+# Rate limit points of a full batch, its releases and refs connections are 200 requests. Updated from responses
+batch_cost = 2
+
+release_fields = """
+fragment ReleaseFields on Release {
+  databaseId
+  name
+  tagName
+  url
+  description
+  isDraft
+  isPrerelease
+  publishedAt
+  updatedAt
+}
+"""
+
+repo_fields = """
+fragment RepoFields on Repository {
+  databaseId
+  isArchived
+  latestRelease { ...ReleaseFields }
+  releases(first: 1, orderBy: {field: CREATED_AT, direction: DESC}) { nodes { ...ReleaseFields } }
+  refs(refPrefix: "refs/tags/", first: 1, orderBy: {field: ALPHABETICAL, direction: DESC}) {
+    nodes {
+      name
+      target {
+        ... on Commit { committedDate }
+        ... on Tag { tagger { date } }
+      }
+    }
+  }
+}
+"""
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class GraphQLRelease(object):
+    """GraphQL Release node with the GitRelease attributes used by store_release_facts"""
+
+    def __init__(self, data):
+        self.id = data['databaseId']
+        self.title = data['name']
+        self.tag_name = data['tagName']
+        self.html_url = data['url']
+        self.body = data['description'] or ""
+        self.draft = data['isDraft']
+        self.prerelease = data['isPrerelease']
+        self.published_at = _parse_datetime(data['publishedAt'])
+        self.last_modified_datetime = _parse_datetime(data['updatedAt'])
+
+
+class GraphQLTag(object):
+    """GraphQL Ref node with the Tag attributes used by store_release_facts"""
+
+    def __init__(self, data):
+        self.name = data['name']
+        target = data['target'] or {}
+        if 'committedDate' in target:
+            self.last_modified_datetime = _parse_datetime(target['committedDate'])
+        elif target.get('tagger'):
+            self.last_modified_datetime = _parse_datetime(target['tagger']['date'])
+        else:
+            self.last_modified_datetime = None
+
+
+def build_batch_query(node_ids):
+    aliases = "\n".join(f"  r{i}: node(id: {json.dumps(node_id)}) {{ ...RepoFields }}"
+                        for i, node_id in enumerate(node_ids))
+    return f"query {{\n  rateLimit {{ cost }}\n{aliases}\n}}\n{repo_fields}{release_fields}"
+
+
+def fetch_repos_batch(node_ids):
+    """Fetch archived flag, latest release, newest release and newest tag for up to GRAPHQL_BATCH_SIZE repos.
+
+    Returns dict of node_id -> raw Repository node, None for repos that were not resolved."""
+    global batch_cost
+    requester = github_obj.requester
+    # graphql_query raises on any error, but a single deleted repo mustn't fail the whole batch
+    response_headers, data = requester.requestJsonAndCheck("POST", requester.graphql_url,
+                                                           input={"query": build_batch_query(node_ids),
+                                                                  "variables": {}})
+    nodes = data.get('data') or {}
+    if nodes.get('rateLimit') and len(node_ids) == GRAPHQL_BATCH_SIZE:
+        batch_cost = nodes['rateLimit']['cost']
+    return {node_id: nodes.get(f"r{i}") for i, node_id in enumerate(node_ids)}
+
+
+def parse_repo_node(node):
+    """Convert a Repository node to (archived, release, prerelease, tag) as fetch_latest_release does"""
+    release = None
+    prerelease = None
+    tag = None
+
+    if node['latestRelease']:
+        release = GraphQLRelease(node['latestRelease'])
+        if release.draft:
+            release = None
+    if app.config['PROCESS_PRE_RELEASES'] and node['releases']['nodes']:
+        prerelease = select_prerelease(GraphQLRelease(node['releases']['nodes'][0]))
+    if not node['latestRelease'] and node['refs']['nodes']:
+        tag = GraphQLTag(node['refs']['nodes'][0])
+
+    return node['isArchived'], release, prerelease, tag
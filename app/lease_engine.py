@@ -0,0 +1,83 @@
+import math
+from datetime import timedelta
+
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Lease, aware_utcnow
+
+LEASE_TTL = timedelta(seconds=90)
+HEARTBEAT_SECONDS = 30
+LEADER_LEASE = "leader"
+
+
+def acquire_lease(session, name, owner):
+    """Take a free or expired lease or renew an own one, returns True when owner holds it for LEASE_TTL"""
+    now = aware_utcnow()
+    # Single conditional UPDATE, so two workers can't both take the same lease
+    acquired = session.execute(update(Lease)
+                               .where(Lease.name == name)
+                               .where((Lease.owner == owner) | (Lease.expires_at < now))
+                               .values(owner=owner, expires_at=now + LEASE_TTL),
+                               execution_options={'synchronize_session': False}).rowcount > 0
+    if not acquired and not session.scalar(select(exists().where(Lease.name == name))):
+        session.add(Lease(name=name, owner=owner, expires_at=now + LEASE_TTL))
+        acquired = True
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another worker created it first
+        session.rollback()
+        acquired = False
+    return acquired
+
+
+def release_lease(session, name, owner):
+    session.execute(delete(Lease).where(Lease.name == name).where(Lease.owner == owner),
+                    execution_options={'synchronize_session': False})
+    session.commit()
+
+
+class Coordinator(object):
+    """Holds this worker's leases, repos are split into shards by id and every live worker polls a fair share.
+
+    One of the workers is the leader and runs the jobs which must not run twice."""
+
+    def __init__(self, app=None):
+        self.worker_id = None
+        self.shard_count = 1
+        self.shards = set()
+        self.leader = False
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.worker_id = app.config['WORKER_ID']
+        self.shard_count = app.config['POLL_SHARDS']
+
+    def heartbeat(self, session):
+        acquire_lease(session, f"worker:{self.worker_id}", self.worker_id)
+        self.leader = acquire_lease(session, LEADER_LEASE, self.worker_id)
+
+        worker_count = session.scalar(select(func.count())
+                                      .where(Lease.name.startswith("worker:"))
+                                      .where(Lease.expires_at >= aware_utcnow()))
+        fair_share = math.ceil(self.shard_count / max(worker_count, 1))
+
+        # Renew held shards first, so shards only move when workers come or go
+        shards = set()
+        candidates = sorted(self.shards) + [shard for shard in range(self.shard_count) if shard not in self.shards]
+        for shard in candidates:
+            if len(shards) >= fair_share:
+                break
+            if acquire_lease(session, f"shard:{shard}", self.worker_id):
+                shards.add(shard)
+        for shard in self.shards - shards:
+            # Over the fair share after another worker joined
+            release_lease(session, f"shard:{shard}", self.worker_id)
+        self.shards = shards
+
+    def shard_filter(self, repo_id_column):
+        """SQL condition selecting repos of the held shards"""
+        return (repo_id_column % self.shard_count).in_(sorted(self.shards))
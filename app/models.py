@@ -11,41 +11,72 @@ class Chat(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     lang = db.Column(db.String(2), default='en')
     github_username = db.Column(db.String)
+    github_starred_at = db.Column(db.DateTime)  # Newest synced star of github_username
     release_note_format = db.Column(db.String)
     created_at = db.Column(db.DateTime, default=aware_utcnow)
 
     repos = db.relationship('Repo', secondary='chat_repo', back_populates='chats')
+    outbox = db.relationship('Outbox', cascade="all, delete-orphan")
 
 
 class Repo(db.Model):
+    __table_args__ = (
+        db.Index('ix_repo_package_ecosystem_package_name', 'package_ecosystem', 'package_name'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String)
+    node_id = db.Column(db.String)
     description = db.Column(db.String)
     link = db.Column(db.String)
     archived = db.Column(db.Boolean)
+    next_poll_at = db.Column(db.DateTime)
+    # Package the repo was subscribed through, its registry feed tells when the repo needs polling
+    package_ecosystem = db.Column(db.String)
+    package_name = db.Column(db.String)
+    webhook_at = db.Column(db.DateTime)  # Last GitHub webhook delivery, repo is polled rarely while it is recent
+    # Denormalized pointers to the newest Release rows, so the releases collection isn't loaded just for them
+    latest_release_id = db.Column(db.Integer)
+    latest_stable_release_id = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=aware_utcnow)
 
     chats = db.relationship('Chat', secondary='chat_repo', back_populates='repos')
     releases = db.relationship('Release', back_populates='repos', cascade="all, delete-orphan")
-
-    def is_orphan(self):
-        # TODO: Use SQL COUNT instead Python len
-        return len(self.chats) == 0
+    latest_release = db.relationship('Release', primaryjoin='foreign(Repo.latest_release_id) == Release.id',
+                                     viewonly=True)
+    latest_stable_release = db.relationship('Release',
+                                            primaryjoin='foreign(Repo.latest_stable_release_id) == Release.id',
+                                            viewonly=True)
+    http_cache = db.relationship('HttpCache', cascade="all, delete-orphan")
 
     def get_latest_release(self):
-        if self.releases:
-            return self.releases[-1]
-        else:
-            return None
+        return self.latest_release
+
+    def update_latest_release(self, release_obj):
+        if not self.latest_release_id or release_obj.id > self.latest_release_id:
+            self.latest_release_id = release_obj.id
+        if not release_obj.pre_release:
+            if not self.latest_stable_release_id or release_obj.id > self.latest_stable_release_id:
+                self.latest_stable_release_id = release_obj.id
 
 
 class ChatRepo(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_repo_repo_id', 'repo_id'),
+    )
+
     chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'), primary_key=True)
     repo_id = db.Column(db.Integer, db.ForeignKey('repo.id'), primary_key=True)
     process_pre_releases = db.Column(db.Boolean, default=True, server_default=db.sql.True_())
 
 
 class Release(db.Model):
+    __table_args__ = (
+        db.Index('ix_release_repo_id_release_id', 'repo_id', 'release_id'),
+        db.Index('ix_release_repo_id_tag_name', 'repo_id', 'tag_name'),
+        db.Index('ix_release_repo_id_pre_release_id', 'repo_id', 'pre_release', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     release_id = db.Column(db.Integer)
     tag_name = db.Column(db.String)
@@ -56,3 +87,65 @@ class Release(db.Model):
 
     repo_id = db.Column(db.ForeignKey('repo.id'))
     repos = db.relationship('Repo', back_populates='releases')
+
+
+class HttpCache(db.Model):
+    repo_id = db.Column(db.Integer, db.ForeignKey('repo.id'), primary_key=True)
+    endpoint = db.Column(db.String, primary_key=True)
+    etag = db.Column(db.String)
+    last_modified = db.Column(db.String)
+
+
+# Position in a package registry updates feed, so a restart picks up where the previous process stopped
+class FeedCursor(db.Model):
+    ecosystem = db.Column(db.String, primary_key=True)
+    cursor = db.Column(db.String, nullable=False)
+
+
+class PackageMapping(db.Model):
+    ecosystem = db.Column(db.String, primary_key=True)
+    package = db.Column(db.String, primary_key=True)
+    repo_name = db.Column(db.String)  # None when package has no GitHub link
+    resolved_at = db.Column(db.DateTime, default=aware_utcnow)
+
+
+# Notification queued in the same transaction as the release change and sent by the deliver_notifications job
+class Outbox(db.Model):
+    __table_args__ = (
+        db.Index('ix_outbox_key', 'key', unique=True),
+        db.Index('ix_outbox_next_attempt_at', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String, nullable=False)  # Idempotency key, the same notification is never queued twice
+    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'), nullable=False)
+    text = db.Column(db.String, nullable=False)
+    parse_mode = db.Column(db.String)
+    preview_url = db.Column(db.String)  # Link preview is disabled when empty
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=aware_utcnow)  # None once delivered
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=aware_utcnow)
+
+
+class Lease(db.Model):
+    name = db.Column(db.String, primary_key=True)
+    owner = db.Column(db.String, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+# Row counts kept up to date by database triggers, so statistics don't scan ever growing tables.
+# Each count is the sum of its slot rows, writers on different connections update different rows
+class Counter(db.Model):
+    name = db.Column(db.String, primary_key=True)  # Counted table
+    slot = db.Column(db.Integer, primary_key=True, default=0)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def get_counts(session):
+        counts = dict(session.query(Counter.name, db.func.sum(Counter.value)).group_by(Counter.name).all())
+        # Databases without counter triggers are counted directly
+        for model in (Chat, Repo, ChatRepo, Release):
+            if model.__tablename__ not in counts:
+                counts[model.__tablename__] = session.query(model).count()
+        return counts
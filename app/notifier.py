@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import telegram
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+# Look at https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+GLOBAL_MESSAGES_PER_SECOND = 30
+PRIVATE_CHAT_MESSAGE_INTERVAL = 1  # seconds
+GROUP_CHAT_MESSAGE_INTERVAL = 3  # seconds, 20 messages per minute
+MAX_SEND_ATTEMPTS = 3
+
+
+class Notifier(object):
+    """Sends notifications from one long-lived event loop and HTTP connection pool"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.bot = None
+        self.loop = None
+        self.concurrency = None
+        self._global_lock = None
+        self._global_next_at = 0
+        self._chat_next_at = {}
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.concurrency = app.config['NOTIFY_CONCURRENCY']
+        self.bot = Bot(app.config['TELEGRAM_BOT_TOKEN'],
+                       request=HTTPXRequest(connection_pool_size=self.concurrency))
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, name='notifier')
+        thread.daemon = True
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self._initialize(), self.loop).result()
+
+    async def _initialize(self):
+        self._global_lock = asyncio.Lock()
+        await self.bot.initialize()
+
+    async def _wait_chat_turn(self, chat_id):
+        # Per chat pacing, group chats have negative ids and a stricter limit
+        interval = GROUP_CHAT_MESSAGE_INTERVAL if chat_id < 0 else PRIVATE_CHAT_MESSAGE_INTERVAL
+        chat_at = self._chat_next_at.get(chat_id, 0)
+        self._chat_next_at[chat_id] = max(chat_at, time.monotonic()) + interval
+        await asyncio.sleep(max(chat_at - time.monotonic(), 0))
+
+    async def _wait_global_turn(self):
+        # Global pacing, slots are handed out one by one
+        async with self._global_lock:
+            global_at = max(self._global_next_at, time.monotonic())
+            self._global_next_at = global_at + 1 / GLOBAL_MESSAGES_PER_SECOND
+        await asyncio.sleep(max(global_at - time.monotonic(), 0))
+
+    async def _send(self, semaphore, message):
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            # Outside of the semaphore, so a burst to one chat doesn't hold the slots of other chats
+            await self._wait_chat_turn(message['chat_id'])
+            async with semaphore:
+                await self._wait_global_turn()
+                try:
+                    await self.bot.send_message(**message)
+                    return None
+                except telegram.error.RetryAfter as e:
+                    self.app.logger.warning(f"Telegram flood limit hit, retry after {e.retry_after}s")
+                    # Flood limit applies to the whole bot, so hold back all sends
+                    self._global_next_at = max(self._global_next_at, time.monotonic() + e.retry_after)
+                    if attempt == MAX_SEND_ATTEMPTS - 1:
+                        return e
+                except telegram.error.TelegramError as e:
+                    return e
+
+    async def _send_many(self, messages):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started_at = time.monotonic()
+        results = await asyncio.gather(*(self._send(semaphore, message) for message in messages))
+
+        # Chats whose next turn has passed pace like never messaged ones, forget them
+        now = time.monotonic()
+        self._chat_next_at = {chat_id: chat_at for chat_id, chat_at in self._chat_next_at.items() if chat_at > now}
+
+        elapsed = time.monotonic() - started_at
+        if messages:
+            self.app.logger.info(f"Sent {len(messages)} messages in {elapsed:.1f}s "
+                                 f"({len(messages) / max(elapsed, 0.001):.1f} msg/s)")
+        return results
+
+    def send_many(self, messages):
+        """Send messages given as send_message kwargs, block until done.
+
+        Returns a list with None for each delivered message or the TelegramError that prevented delivery."""
+        return asyncio.run_coroutine_threadsafe(self._send_many(messages), self.loop).result()
@@ -0,0 +1,444 @@
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import xml.etree.ElementTree as ET
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone, timedelta
+from http import HTTPStatus
+from xml.parsers.expat import ExpatError
+
+import github
+import httpx
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+
+from app import app, github_obj, graphql_engine
+from app.graphql_engine import GRAPHQL_BATCH_SIZE, fetch_repos_batch, parse_repo_node
+from app.models import FeedCursor, HttpCache, Release, Repo, aware_utcnow
+from app.repo_engine import NpmSource, PyPISource, fetch_latest_release
+
+POLL_TICK_MINUTES = 5
+# Worst case of fetch_repo_snapshot: conditional repo, releases, latest release and tags requests, then
+# fetch_latest_release counts and reads releases, misses the latest one and counts and reads tags
+REST_CALLS_PER_REPO = 8
+REPO_ID_BATCH_SIZE = 500  # Repo ids per IN list, SQLite limits the number of bound parameters
+CADENCE_SAMPLE_SIZE = 10
+CADENCE_DIVISOR = 48
+PACKAGE_UPDATE_BATCH_SIZE = 500
+WEBHOOK_EXPIRY = timedelta(days=30)  # Without deliveries for that long the webhook may be gone, poll as usual
+FEED_POLL_LIMIT = 5000  # Repos one poll tick checks through Atom feeds
+ATOM_NAMESPACE = "{http://www.w3.org/2005/Atom}"
+
+release_sources = [PyPISource(), NpmSource()]
+
+# Shared by poll workers, feeds are served by the GitHub web site, not by the API
+feed_client = httpx.Client(follow_redirects=True, timeout=10,
+                           limits=httpx.Limits(max_connections=app.config['POLL_CONCURRENCY']))
+
+
+class RepoSnapshot(object):
+    """GitHub state of a single repo fetched by a poll worker"""
+
+    def __init__(self, repo_id):
+        self.repo_id = repo_id
+        self.node_id = None
+        self.archived = None
+        self.release = None
+        self.prerelease = None
+        self.tag = None
+        self.deleted = False
+        self.not_modified = False
+        self.deferred = False  # No rate limit budget left to fetch the repo, it stays due
+        self.validators = {}
+        self.error = None
+
+
+def spread_rate(rate):
+    """Calls one poll tick may make, spreading the remaining rate limit evenly until its reset"""
+    seconds_left = max((rate.reset - datetime.now(timezone.utc)).total_seconds(), 0)
+    ticks_left = max(math.ceil(seconds_left / (POLL_TICK_MINUTES * 60)), 1)
+    return rate.remaining / ticks_left
+
+
+def get_poll_budget():
+    """Number of repos one poll tick may check as (through GraphQL batches, through REST API).
+
+    GraphQL and REST API rate limits are separate pools. Repos without node id are fetched from REST API in
+    GraphQL mode too."""
+    rate_limit = github_obj.get_rate_limit()
+    graphql_budget = 0
+    if app.config['POLL_GRAPHQL']:
+        graphql_budget = int(spread_rate(rate_limit.graphql) / graphql_engine.batch_cost) * GRAPHQL_BATCH_SIZE
+    rest_budget = int(spread_rate(rate_limit.core) / REST_CALLS_PER_REPO)
+    return graphql_budget, rest_budget
+
+
+def get_due_repos(session, limit, shard_condition=None):
+    now = aware_utcnow()
+    query = session.query(Repo)
+    if shard_condition is not None:
+        query = query.filter(shard_condition)
+    return query \
+        .options(joinedload(Repo.latest_release)) \
+        .filter((Repo.next_poll_at.is_(None)) | (Repo.next_poll_at <= now)) \
+        .order_by(Repo.next_poll_at.is_not(None), Repo.next_poll_at) \
+        .limit(limit) \
+        .all()
+
+
+def mark_updated_packages_due(session):
+    """Make repos of packages updated in registry feeds due for polling now, returns their number"""
+    now = aware_utcnow()
+    due_count = 0
+    for source in release_sources:
+        packages = set(session.scalars(select(Repo.package_name)
+                                       .where(Repo.package_ecosystem == source.ecosystem)
+                                       .distinct()))
+        if not packages:
+            continue
+
+        cursor_obj = session.get(FeedCursor, source.ecosystem)
+        try:
+            updated_packages, cursor = source.fetch_updated_packages(cursor_obj.cursor if cursor_obj else None)
+        except (httpx.HTTPError, ValueError, KeyError, xmlrpc.client.Error, ExpatError) as e:
+            app.logger.error(f"Can't fetch {source.ecosystem} updates feed: {e}")
+            continue
+        session.merge(FeedCursor(ecosystem=source.ecosystem, cursor=cursor))
+        if updated_packages is None:
+            # Feed can't tell what changed, repos keep their release cadence schedule rather than all becoming due
+            app.logger.info(f"{source.ecosystem} updates feed can't tell which packages changed")
+            continue
+
+        packages = list(packages & updated_packages)
+        for i in range(0, len(packages), PACKAGE_UPDATE_BATCH_SIZE):
+            due_count += session.execute(update(Repo)
+                                         .where(Repo.package_ecosystem == source.ecosystem)
+                                         .where(Repo.package_name.in_(packages[i:i + PACKAGE_UPDATE_BATCH_SIZE]))
+                                         .values(next_poll_at=now),
+                                         execution_options={'synchronize_session': False}).rowcount
+    session.commit()
+    return due_count
+
+
+def get_poll_interval(archived, release_dates):
+    """Poll interval following repo release cadence, release_dates are sorted from newest"""
+    min_interval = timedelta(minutes=app.config['POLL_MIN_INTERVAL'])
+    max_interval = timedelta(minutes=app.config['POLL_MAX_INTERVAL'])
+
+    if archived:
+        return max_interval * 4
+    if not release_dates:
+        return max_interval
+
+    release_dates = [release_date.replace(tzinfo=timezone.utc) for release_date in release_dates]
+    idle = datetime.now(timezone.utc) - release_dates[0]
+    gaps = [newer - older for newer, older in zip(release_dates, release_dates[1:])]
+    cadence = statistics.median(gaps) if gaps else idle
+    # Repo that stopped releasing is dormant regardless of its past cadence
+    expected = max(cadence, idle)
+
+    return min(max(expected / CADENCE_DIVISOR, min_interval), max_interval)
+
+
+def schedule_next_polls(session, repo_ids):
+    now = aware_utcnow()
+    max_interval = timedelta(minutes=app.config['POLL_MAX_INTERVAL'])
+    for i in range(0, len(repo_ids), REPO_ID_BATCH_SIZE):
+        batch_repo_ids = repo_ids[i:i + REPO_ID_BATCH_SIZE]
+        release_dates = {}
+        for repo_id, release_date in session.query(Release.repo_id, Release.release_date) \
+                .filter(Release.repo_id.in_(batch_repo_ids)) \
+                .filter(Release.release_date.is_not(None)) \
+                .order_by(Release.repo_id, Release.release_date.desc()):
+            dates = release_dates.setdefault(repo_id, [])
+            if len(dates) < CADENCE_SAMPLE_SIZE:
+                dates.append(release_date)
+
+        for repo_obj in session.query(Repo).filter(Repo.id.in_(batch_repo_ids)):
+            interval = get_poll_interval(repo_obj.archived, release_dates.get(repo_obj.id, []))
+            if repo_obj.webhook_at and repo_obj.webhook_at.replace(tzinfo=timezone.utc) > now - WEBHOOK_EXPIRY:
+                # Webhook delivers releases within seconds, rare polls only catch what a removed webhook misses
+                interval = max(interval, max_interval)
+            # Jitter keeps repos added at the same time from being polled in one burst forever
+            repo_obj.next_poll_at = now + interval * random.uniform(0.9, 1.1)
+
+
+def load_validators(session, repo_ids):
+    validators = {}
+    for i in range(0, len(repo_ids), REPO_ID_BATCH_SIZE):
+        for cache_obj in session.query(HttpCache).filter(HttpCache.repo_id.in_(repo_ids[i:i + REPO_ID_BATCH_SIZE])):
+            validators.setdefault(cache_obj.repo_id, {})[cache_obj.endpoint] = (cache_obj.etag,
+                                                                                cache_obj.last_modified)
+    return validators
+
+
+def store_validators(session, repo_id, validators):
+    for endpoint, (etag, last_modified) in validators.items():
+        session.merge(HttpCache(
+            repo_id=repo_id,
+            endpoint=endpoint,
+            etag=etag,
+            last_modified=last_modified,
+        ))
+
+
+def conditional_get(url, validator):
+    headers = {}
+    if validator:
+        etag, last_modified = validator
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    # requestJson doesn't raise on 304/404, unlike the PyGithub object API
+    status, response_headers, output = github_obj.requester.requestJson("GET", url, headers=headers)
+    return status, (response_headers.get('etag'), response_headers.get('last-modified')), output
+
+
+def has_fresh_prerelease(output):
+    # store_release_facts skips pre-releases younger than 15 minutes, so they must not be cached as seen
+    releases = json.loads(output) if output else []
+    if releases and releases[0]['prerelease'] and releases[0]['published_at']:
+        published_at = datetime.fromisoformat(releases[0]['published_at'])
+        return datetime.now(timezone.utc) - timedelta(minutes=15) < published_at
+    return False
+
+
+def check_releases_modified(repo, validators, snapshot):
+    """Send conditional requests for the release endpoints, return False when all of them replied 304"""
+    modified = False
+
+    if app.config['PROCESS_PRE_RELEASES']:
+        status, validator, output = conditional_get(f"{repo.url}/releases?per_page=1", validators.get('releases'))
+        if status != HTTPStatus.NOT_MODIFIED:
+            modified = True
+            if status == HTTPStatus.OK and not has_fresh_prerelease(output):
+                snapshot.validators['releases'] = validator
+
+    endpoint = 'latest'
+    status, validator, output = conditional_get(f"{repo.url}/releases/latest", validators.get(endpoint))
+    if status == HTTPStatus.NOT_FOUND:
+        # Repo has no releases yet, store_release_facts falls back to tags
+        endpoint = 'tags'
+        status, validator, output = conditional_get(f"{repo.url}/tags?per_page=1", validators.get(endpoint))
+    if status != HTTPStatus.NOT_MODIFIED:
+        modified = True
+        if status == HTTPStatus.OK:
+            snapshot.validators[endpoint] = validator
+
+    return modified
+
+
+def fetch_repo_snapshot(repo_id, validators):
+    # Runs in a worker thread, so only GitHub calls here, no database access
+    snapshot = RepoSnapshot(repo_id)
+    try:
+        # Lazy repo sends no request, repo and its releases are requested conditionally, so a 304 poll is free
+        repo = github_obj.get_repo(repo_id, lazy=True)
+        status, validator, output = conditional_get(repo.url, validators.get('repo'))
+        if status == HTTPStatus.NOT_FOUND:
+            snapshot.deleted = True
+            return snapshot
+        if status == HTTPStatus.OK:
+            repo_data = json.loads(output)
+            snapshot.node_id = repo_data['node_id']
+            snapshot.archived = repo_data['archived']
+            snapshot.validators['repo'] = validator
+        elif status != HTTPStatus.NOT_MODIFIED:
+            raise github.GithubException(status, output)
+
+        if not check_releases_modified(repo, validators, snapshot):
+            snapshot.not_modified = True
+            return snapshot
+        snapshot.release, snapshot.prerelease, snapshot.tag = fetch_latest_release(repo)
+    except github.UnknownObjectException as e:
+        snapshot.deleted = True
+    except github.GithubException as e:
+        snapshot.error = e
+
+    return snapshot
+
+
+def read_feed_head(url, validator):
+    """Conditional GET of an Atom feed, parsed incrementally only up to its first entry.
+
+    Returns (status, validator, (tag name, updated) of the newest entry or None)"""
+    headers = {}
+    if validator:
+        etag, last_modified = validator
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    with feed_client.stream("GET", url, headers=headers) as resp:
+        if resp.status_code != HTTPStatus.OK:
+            return resp.status_code, None, None
+
+        validator = (resp.headers.get('etag'), resp.headers.get('last-modified'))
+        parser = ET.XMLPullParser(events=("end",))
+        for chunk in resp.iter_bytes():
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if element.tag == f"{ATOM_NAMESPACE}entry":
+                    # Entry id is tag:github.com,2008:Repository/<repo id>/<tag name>
+                    tag_name = element.findtext(f"{ATOM_NAMESPACE}id", "").split("/", 2)[-1]
+                    updated = datetime.fromisoformat(element.findtext(f"{ATOM_NAMESPACE}updated"))
+                    return resp.status_code, validator, (tag_name, updated)
+
+    return HTTPStatus.OK, validator, None
+
+
+def check_feeds_modified(full_name, validators, latest, snapshot):
+    """Check releases and tags Atom feeds, return False when they show nothing newer than latest (tag name, date)"""
+    endpoint = 'releases.atom'
+    status, validator, entry = read_feed_head(f"{app.config['GITHUB_URL']}/{full_name}/releases.atom",
+                                              validators.get(endpoint))
+    if status == HTTPStatus.NOT_MODIFIED and 'tags.atom' not in validators:
+        return False
+    if status == HTTPStatus.NOT_MODIFIED or (status == HTTPStatus.OK and not entry):
+        # Repo has no releases, store_release_facts falls back to tags
+        if status == HTTPStatus.OK:
+            snapshot.validators[endpoint] = validator
+        endpoint = 'tags.atom'
+        status, validator, entry = read_feed_head(f"{app.config['GITHUB_URL']}/{full_name}/tags.atom",
+                                                  validators.get(endpoint))
+        if status == HTTPStatus.NOT_MODIFIED:
+            return False
+    if status != HTTPStatus.OK:
+        # Renamed, deleted or private repo, let REST API sort it out
+        return True
+
+    snapshot.validators[endpoint] = validator
+    if not entry:
+        return False
+    if not latest:
+        return True
+
+    tag_name, updated = entry
+    latest_tag_name, latest_date = latest
+    if tag_name != latest_tag_name:
+        return True
+    if endpoint == 'tags.atom' or not latest_date:
+        # Tag dates come from commits and are not comparable
+        return False
+    # Edited release
+    return updated > latest_date.replace(tzinfo=timezone.utc) + timedelta(minutes=1)
+
+
+def fetch_feed_snapshots(repo_id, full_name, validators, latest, rest_budget):
+    # Runs in a worker thread, REST API is only called when feeds changed
+    snapshot = RepoSnapshot(repo_id)
+    try:
+        modified = check_feeds_modified(full_name, validators, latest, snapshot)
+    except (httpx.HTTPError, ValueError, ET.ParseError) as e:
+        snapshot.error = e
+        return [snapshot]
+
+    if not modified:
+        snapshot.not_modified = True
+        return [snapshot]
+    if not rest_budget.acquire(blocking=False):
+        snapshot.deferred = True
+        return [snapshot]
+
+    feed_validators = snapshot.validators
+    snapshot = fetch_repo_snapshot(repo_id, validators)
+    # Feed validators are only stored together with the REST state they led to, modified or not
+    snapshot.validators.update(feed_validators)
+    return [snapshot]
+
+
+def fetch_rest_snapshots(repo_id, validators, rest_budget):
+    if not rest_budget.acquire(blocking=False):
+        snapshot = RepoSnapshot(repo_id)
+        snapshot.deferred = True
+        return [snapshot]
+    return [fetch_repo_snapshot(repo_id, validators)]
+
+
+def fetch_batch_snapshots(repo_ids_by_node_id, validators, rest_budget):
+    # Runs in a worker thread, one GraphQL request for the whole batch
+    try:
+        nodes = fetch_repos_batch(list(repo_ids_by_node_id))
+    except github.GithubException as e:
+        # Likely rate limited, the whole batch stays due for the next tick instead of falling back to REST API
+        app.logger.error(f"GithubException in GraphQL batch of {len(repo_ids_by_node_id)} repos: {e}")
+        snapshots = [RepoSnapshot(repo_id) for repo_id in repo_ids_by_node_id.values()]
+        for snapshot in snapshots:
+            snapshot.deferred = True
+        return snapshots
+
+    snapshots = []
+    for node_id, node in nodes.items():
+        repo_id = repo_ids_by_node_id[node_id]
+        if node is None:
+            # Deleted or inaccessible, let REST API sort it out while its budget lasts
+            snapshots.extend(fetch_rest_snapshots(repo_id, validators.get(repo_id, {}), rest_budget))
+            continue
+
+        snapshot = RepoSnapshot(repo_id)
+        snapshot.node_id = node_id
+        snapshot.archived, snapshot.release, snapshot.prerelease, snapshot.tag = parse_repo_node(node)
+        snapshots.append(snapshot)
+
+    return snapshots
+
+
+def poll_repos(repo_objs, validators, rest_budget=0, graphql_budget=0):
+    """Fetch repos concurrently, yield (repo_obj, snapshot) pairs in the caller thread as they complete.
+
+    At most rest_budget repos are fetched from REST API and graphql_budget repos through GraphQL batches, the others
+    come back deferred. With POLL_ATOM repos are checked through feeds and only changed ones are fetched."""
+    repo_objs = {repo_obj.id: repo_obj for repo_obj in repo_objs}
+    if not repo_objs:
+        return
+
+    batches = []
+    rest_repo_ids = []
+    feed_repos = []
+    deferred_repo_ids = []
+    rest_budget = threading.Semaphore(rest_budget)
+    if app.config['POLL_ATOM']:
+        # Latest release is read here, worker threads have no database access
+        feed_repos = [(repo_obj.id, repo_obj.full_name,
+                       (repo_obj.latest_release.tag_name, repo_obj.latest_release.release_date)
+                       if repo_obj.latest_release else None)
+                      for repo_obj in repo_objs.values()]
+    elif app.config['POLL_GRAPHQL']:
+        graphql_repo_objs = [repo_obj for repo_obj in repo_objs.values() if repo_obj.node_id]
+        deferred_repo_ids = [repo_obj.id for repo_obj in graphql_repo_objs[graphql_budget:]]
+        graphql_repo_objs = graphql_repo_objs[:graphql_budget]
+        for i in range(0, len(graphql_repo_objs), GRAPHQL_BATCH_SIZE):
+            batches.append({repo_obj.node_id: repo_obj.id for repo_obj in graphql_repo_objs[i:i + GRAPHQL_BATCH_SIZE]})
+        rest_repo_ids = [repo_obj.id for repo_obj in repo_objs.values() if not repo_obj.node_id]
+    else:
+        rest_repo_ids = list(repo_objs)
+
+    for repo_id in deferred_repo_ids:
+        snapshot = RepoSnapshot(repo_id)
+        snapshot.deferred = True
+        yield repo_objs[repo_id], snapshot
+
+    concurrency = app.config['POLL_CONCURRENCY']
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='poll') as executor:
+        futures = [executor.submit(fetch_batch_snapshots, batch, validators, rest_budget) for batch in batches]
+        futures += [executor.submit(fetch_rest_snapshots, repo_id, validators.get(repo_id, {}), rest_budget)
+                    for repo_id in rest_repo_ids]
+        futures += [executor.submit(fetch_feed_snapshots, repo_id, full_name, validators.get(repo_id, {}), latest,
+                                    rest_budget)
+                    for repo_id, full_name, latest in feed_repos]
+        for future in as_completed(futures):
+            for snapshot in future.result():
+                yield repo_objs[snapshot.repo_id], snapshot
+
+    elapsed = time.monotonic() - started_at
+    app.logger.info(f"Poll sweep of {len(repo_objs)} repos ({len(batches)} GraphQL batches, "
+                    f"{len(feed_repos)} through feeds) "
+                    f"with concurrency {concurrency} finished in {elapsed:.1f}s")
@@ -1,12 +1,17 @@
 import re
+import xmlrpc.client
+from abc import ABC, abstractmethod
 from datetime import datetime, timezone, timedelta
 
 import github
+import httpx
+from sqlalchemy import and_, or_
 from telegram.constants import MessageLimit
 from telegramify_markdown import markdownify
 
 from app import app
-from app.models import Release, Repo
+from app.models import Release
+from app.resolver import normalize_package_name
 
 github_extra_html_tags_pattern = re.compile("<p align=\".*?\".*?>|</p>|<a name=\".*?\">|</a>|<picture>.*?</picture>|"
                                             "</?h[1-4]>|</?sub>|</?sup>|</?details>|</?summary>|</?b>|</?dl>|</?dt>|"
@@ -14,6 +19,47 @@ github_extra_html_tags_pattern = re.compile("<p align=\".*?\".*?>|</p>|<a name=\
                                             flags=re.DOTALL)
 github_img_html_tag_pattern = re.compile("<img .*?src=\"(.*?)\".*?>")
 
+TRUNCATE_PRECISION = 32
+
+PYPI_XMLRPC_URL = "https://pypi.org/pypi"
+NPM_CHANGES_URL = "https://replicate.npmjs.com/registry/_changes"
+NPM_CHANGES_PAGE_SIZE = 10000
+NPM_CHANGES_MAX_PAGES = 10
+
+
+def truncate_markdown(header, release_body, message_length):
+    """Longest release body prefix (to TRUNCATE_PRECISION chars) which fits into message after markdownify.
+
+    Rendered length grows almost linearly with body length, so cut point is interpolated from the lengths
+    seen so far, it takes few markdownify calls instead of one per 100 chars. Interpolation aims a bit below
+    the limit, so usually the first cut already fits within TRUNCATE_PRECISION chars and search stops."""
+    skipped = "\n-=SKIPPED=-"
+    limit = MessageLimit.MAX_TEXT_LENGTH - 1
+    message = None
+    # Header alone is rendered only if no body prefix fits, its length is a close enough estimate
+    low, low_length = 0, len(header) + len(skipped)
+    high, high_length = len(release_body), message_length
+    bisect = False
+    while high - low > TRUNCATE_PRECISION and limit - low_length > TRUNCATE_PRECISION:
+        if bisect:
+            middle = (low + high) // 2
+        else:
+            target = limit - TRUNCATE_PRECISION // 2
+            middle = low + (high - low) * (target - low_length) // max(high_length - low_length, 1)
+            middle = min(max(middle, low + TRUNCATE_PRECISION // 2), high - TRUNCATE_PRECISION // 2)
+        candidate = markdownify(f"{header}{release_body[:middle]}{skipped}")
+        if len(candidate) <= limit:
+            low, low_length = middle, len(candidate)
+            message = candidate
+        else:
+            high, high_length = middle, len(candidate)
+        # Alternate with bisection so nonlinear escaping can't slow the interpolation down
+        bisect = not bisect
+
+    if message is None:
+        message = markdownify(f"{header}{skipped}")
+    return message
+
 
 def format_release_message(chat, repo, release):
     release_body = release.body
@@ -52,36 +98,47 @@ def format_release_message(chat, repo, release):
                    f"{" <i>updated</i>" if release.updated else ""}\n"
                    f"<pre>{release_body}</pre>")
     else:
-        message = markdownify(f"*{repo.full_name}*\n"
-                              f"{f"`{release_title}`" if release_title else ""}"
-                              f" [{current_tag}]({release.html_url})"
-                              f"{" _pre-release_" if release.prerelease else ""}"
-                              f"{" _updated_" if release.updated else ""}\n\n"
-                              f"{release_body}")
-        while len(message) >= MessageLimit.MAX_TEXT_LENGTH:
-            release_body = release_body[:len(release_body)-100] + "\n-=SKIPPED=-"
-            message = markdownify(f"*{repo.full_name}*\n"
-                                  f"{f"`{release_title}`" if release_title else ""}"
-                                  f" [{current_tag}]({release.html_url})"
-                                  f"{" _pre-release_" if release.prerelease else ""}"
-                                  f"{" _updated_" if release.updated else ""}\n\n"
-                                  f"{release_body}")
+        header = (f"*{repo.full_name}*\n"
+                  f"{f"`{release_title}`" if release_title else ""}"
+                  f" [{current_tag}]({release.html_url})"
+                  f"{" _pre-release_" if release.prerelease else ""}"
+                  f"{" _updated_" if release.updated else ""}\n\n")
+        message = markdownify(f"{header}{release_body}")
+        if len(message) >= MessageLimit.MAX_TEXT_LENGTH:
+            message = truncate_markdown(header, release_body, len(message))
 
     return message
 
 
-def store_latest_release(session, repo, repo_obj):
+class ReleaseMessageCache(object):
+    """Renders every release note format at most once per release event, whatever the number of subscribers"""
+
+    def __init__(self):
+        self._messages = {}
+
+    def get(self, chat, repo, release):
+        key = (release.id, release.updated, chat.release_note_format)
+        if key not in self._messages:
+            self._messages[key] = format_release_message(chat, repo, release)
+        return self._messages[key]
+
+
+def select_prerelease(prerelease):
+    if not prerelease.prerelease or prerelease.draft:
+        return None
+    if datetime.now(timezone.utc) - timedelta(minutes=15) < prerelease.published_at:
+        return None
+    return prerelease
+
+
+def fetch_latest_release(repo):
     release = None
     prerelease = None
     tag = None
 
     if app.config['PROCESS_PRE_RELEASES']:
         if repo.get_releases().totalCount > 0:
-            prerelease = repo.get_releases()[0]
-            if not prerelease.prerelease or prerelease.draft:
-                prerelease = None
-            if prerelease and datetime.now(timezone.utc) - timedelta(minutes=15) < prerelease.published_at:
-                prerelease = None
+            prerelease = select_prerelease(repo.get_releases()[0])
 
     try:
         release = repo.get_latest_release()
@@ -92,63 +149,162 @@ def store_latest_release(session, repo, repo_obj):
         if repo.get_tags().totalCount > 0:
             tag = repo.get_tags()[0]
 
-    if release or prerelease:
-        if release:
-            release.updated = False
-            release_obj = session.query(Release).join(Repo) \
-                .filter(Repo.id == repo_obj.id).filter(Release.release_id == release.id) \
-                .first()
-            if release_obj:
-                stored_release_date = release_obj.release_date.replace(tzinfo=timezone.utc)
-                if release.last_modified_datetime > stored_release_date:
-                    release_obj.release_date = release.last_modified_datetime
-                    release_obj.pre_release = release.prerelease
-                    session.commit()
-
-                    release.updated = True
-                else:
-                    release = None
-            else:
-                release_obj = Release(
-                    release_id=release.id,
-                    tag_name=release.tag_name,
-                    release_date=release.last_modified_datetime,
-                    link=release.html_url,
-                    pre_release=release.prerelease,
-                )
-                repo_obj.releases.append(release_obj)
-                session.commit()
-
-        if prerelease:
-            prerelease.updated = False
-            release_obj = session.query(Release).join(Repo) \
-                .filter(Repo.id == repo_obj.id).filter(Release.release_id == prerelease.id) \
-                .first()
-            if not release_obj:
-                release_obj = Release(
-                    release_id=prerelease.id,
-                    tag_name=prerelease.tag_name,
-                    release_date=prerelease.published_at,
-                    link=prerelease.html_url,
-                    pre_release=prerelease.prerelease,
-                )
-                repo_obj.releases.append(release_obj)
-                session.commit()
-            else:
-                prerelease = None
-
-        return release, prerelease
-    elif tag:
-        release_obj = session.query(Release).join(Repo) \
-            .filter(Repo.id == repo_obj.id).filter(Release.tag_name == tag.name) \
-            .first()
-        if not release_obj:
-            release_obj = Release(
-                tag_name=tag.name,
-                release_date=tag.last_modified_datetime,
-            )
-            repo_obj.releases.append(release_obj)
-            session.commit()
-            return tag, None
+    return release, prerelease, tag
+
+
+def store_latest_release(session, repo, repo_obj):
+    release, prerelease, tag = fetch_latest_release(repo)
+    return store_release_facts(session, repo_obj, release, prerelease, tag)
 
+
+def store_release_facts(session, repo_obj, release, prerelease, tag):
+    events = store_release_batch(session, [(repo_obj, release, prerelease, tag)])
+    if events:
+        _, release_or_tag, prerelease = events[0]
+        return release_or_tag, prerelease
     return None, None
+
+
+def _new_release(repo_obj, release):
+    return Release(
+        repo_id=repo_obj.id,
+        release_id=release.id,
+        tag_name=release.tag_name,
+        release_date=release.last_modified_datetime,
+        link=release.html_url,
+        pre_release=release.prerelease,
+    )
+
+
+def store_release_batch(session, batch):
+    """Diff fetched (repo_obj, release, prerelease, tag) facts against stored releases.
+
+    Stored releases are looked up with one query and changes are only flushed, the caller commits them
+    together with whatever the events lead to.
+    Returns (repo_obj, release_or_tag, prerelease) notification events for repos with anything new."""
+    release_keys = set()
+    tag_keys = set()
+    for repo_obj, release, prerelease, tag in batch:
+        for item in (release, prerelease):
+            if item:
+                release_keys.add((repo_obj.id, item.id))
+        if tag and not (release or prerelease):
+            tag_keys.add((repo_obj.id, tag.name))
+
+    stored_releases = {}
+    stored_tags = {}
+    if release_keys or tag_keys:
+        # Plain ANDs, SQLite scans the table for row-value IN while it searches the indexes for each OR term
+        conditions = [and_(Release.repo_id == repo_id, Release.release_id == release_id)
+                      for repo_id, release_id in release_keys]
+        conditions += [and_(Release.repo_id == repo_id, Release.tag_name == tag_name)
+                       for repo_id, tag_name in tag_keys]
+        for release_obj in session.query(Release).filter(or_(*conditions)):
+            stored_releases[(release_obj.repo_id, release_obj.release_id)] = release_obj
+            stored_tags[(release_obj.repo_id, release_obj.tag_name)] = release_obj
+
+    events = []
+    new_release_objs = []
+    for repo_obj, release, prerelease, tag in batch:
+        if release or prerelease:
+            if release:
+                release.updated = False
+                release_obj = stored_releases.get((repo_obj.id, release.id))
+                if release_obj:
+                    stored_release_date = release_obj.release_date.replace(tzinfo=timezone.utc)
+                    if release.last_modified_datetime > stored_release_date:
+                        release_obj.release_date = release.last_modified_datetime
+                        release_obj.pre_release = release.prerelease
+                        repo_obj.update_latest_release(release_obj)
+
+                        release.updated = True
+                    else:
+                        release = None
+                else:
+                    new_release_objs.append((repo_obj, _new_release(repo_obj, release)))
+
+            if prerelease:
+                prerelease.updated = False
+                if (repo_obj.id, prerelease.id) not in stored_releases:
+                    release_obj = _new_release(repo_obj, prerelease)
+                    release_obj.release_date = prerelease.published_at
+                    new_release_objs.append((repo_obj, release_obj))
+                else:
+                    prerelease = None
+
+            if release or prerelease:
+                events.append((repo_obj, release, prerelease))
+        elif tag:
+            if (repo_obj.id, tag.name) not in stored_tags:
+                new_release_objs.append((repo_obj, Release(
+                    repo_id=repo_obj.id,
+                    tag_name=tag.name,
+                    release_date=tag.last_modified_datetime,
+                )))
+                events.append((repo_obj, tag, None))
+
+    if new_release_objs:
+        session.add_all(release_obj for _, release_obj in new_release_objs)
+        session.flush()
+        for repo_obj, release_obj in new_release_objs:
+            repo_obj.update_latest_release(release_obj)
+    session.flush()
+
+    return events
+
+
+class ReleaseSource(ABC):
+    """Package registry feed telling which packages got new versions, one request covers all subscribed packages"""
+    ecosystem = None
+
+    @abstractmethod
+    def fetch_updated_packages(self, cursor):
+        """Return names of packages updated since cursor and the cursor to pass next time.
+
+        Names are None when the feed can't tell, without a cursor or when it fell too far behind.
+        Cursor is a string stored between calls, on error it isn't returned, so the next call catches up."""
+
+
+class PyPISource(ReleaseSource):
+    """PyPI changelog, every change has a serial number, so nothing is lost between calls however many there were"""
+    ecosystem = "pypi"
+
+    def _call(self, method, *params):
+        resp = httpx.post(PYPI_XMLRPC_URL, content=xmlrpc.client.dumps(params, method),
+                          headers={"Content-Type": "text/xml"}, timeout=30)
+        resp.raise_for_status()
+        (result,), _ = xmlrpc.client.loads(resp.content)
+        return result
+
+    def fetch_updated_packages(self, cursor):
+        if cursor is None:
+            return None, str(self._call("changelog_last_serial"))
+
+        serial = int(cursor)
+        changes = self._call("changelog_since_serial", serial)
+        if changes:
+            serial = max(serial for name, version, timestamp, action, serial in changes)
+        return ({normalize_package_name(self.ecosystem, name) for name, version, timestamp, action, serial in changes},
+                str(serial))
+
+
+class NpmSource(ReleaseSource):
+    ecosystem = "npm"
+
+    def fetch_updated_packages(self, cursor):
+        since = cursor if cursor is not None else "now"
+        packages = set()
+        for page in range(NPM_CHANGES_MAX_PAGES):
+            resp = httpx.get(NPM_CHANGES_URL, params={"since": since, "limit": NPM_CHANGES_PAGE_SIZE}, timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+
+            packages.update(change['id'] for change in data['results'])
+            since = str(data['last_seq'])
+            if len(data['results']) < NPM_CHANGES_PAGE_SIZE:
+                break
+        else:
+            # Too far behind to tell which of the subscribed packages changed
+            return None, since
+
+        return packages if cursor is not None else None, since
@@ -0,0 +1,205 @@
+import asyncio
+import re
+import urllib.parse
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from http import HTTPStatus
+
+import httpx
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from app.database import insert_dialects
+from app.models import PackageMapping, aware_utcnow
+
+RESOLVE_CONCURRENCY = 16
+MAPPING_TTL = timedelta(days=7)
+NEGATIVE_MAPPING_TTL = timedelta(days=1)  # Package may get its GitHub link in the next release
+MAPPING_LRU_SIZE = 4096
+
+github_link_pattern = re.compile("https://github.com/([^/]+/[^/]+)/?")
+
+# (ecosystem, package) -> (repo name, resolved at), in front of the package_mapping table
+mapping_lru = OrderedDict()
+
+
+def pypi_repo_name(pypi_data):
+    repo_name = None
+    if pypi_data["info"]["project_urls"]:
+        if ("Source" in pypi_data["info"]["project_urls"] and
+                github_link_pattern.search(pypi_data["info"]["project_urls"]["Source"])):
+            link_groups = github_link_pattern.search(pypi_data["info"]["project_urls"]["Source"])
+            repo_name = link_groups.group(1)
+        elif ("Source Code" in pypi_data["info"]["project_urls"] and
+              github_link_pattern.search(pypi_data["info"]["project_urls"]["Source Code"])):
+            link_groups = github_link_pattern.search(pypi_data["info"]["project_urls"]["Source Code"])
+            repo_name = link_groups.group(1)
+        elif ("Homepage" in pypi_data["info"]["project_urls"] and
+              github_link_pattern.search(pypi_data["info"]["project_urls"]["Homepage"])):
+            link_groups = github_link_pattern.search(pypi_data["info"]["project_urls"]["Homepage"])
+            repo_name = link_groups.group(1)
+    elif pypi_data["info"]["home_page"] and github_link_pattern.search(pypi_data["info"]["home_page"]):
+        link_groups = github_link_pattern.search(pypi_data["info"]["home_page"])
+        repo_name = link_groups.group(1)
+
+    return repo_name
+
+
+def npm_repo_name(npm_data):
+    repo_name = None
+    if ("repository" in npm_data["collected"]["metadata"]["links"] and
+            github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["repository"])):
+        link_groups = github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["repository"])
+        repo_name = link_groups.group(1)
+    elif ("homepage" in npm_data["collected"]["metadata"]["links"] and
+          github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["homepage"])):
+        link_groups = github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["homepage"])
+        repo_name = link_groups.group(1)
+
+    return repo_name
+
+
+async def resolve_package(client, ecosystem, name):
+    """Find GitHub repo of PyPI or npm package, returns (HTTP status, owner/repo or None)"""
+    if ecosystem == "pypi":
+        resp = await client.get(f"https://pypi.org/pypi/{name}/json")
+        parse = pypi_repo_name
+    else:
+        resp = await client.get(f"https://api.npms.io/v2/package/{urllib.parse.quote(name, safe='')}")
+        parse = npm_repo_name
+
+    if resp.status_code == HTTPStatus.OK:
+        return resp.status_code, parse(resp.json())
+    return resp.status_code, None
+
+
+async def fetch_packages(ecosystem, names):
+    """Resolve package names concurrently over one connection pool, returns name -> (status, repo name)"""
+    semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+    limits = httpx.Limits(max_connections=RESOLVE_CONCURRENCY, max_keepalive_connections=RESOLVE_CONCURRENCY)
+
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+        async def resolve(name):
+            async with semaphore:
+                try:
+                    return await resolve_package(client, ecosystem, name)
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    return None, None
+
+        results = await asyncio.gather(*(resolve(name) for name in names))
+
+    return dict(zip(names, results))
+
+
+def normalize_package_name(ecosystem, name):
+    if ecosystem == "pypi":
+        # PEP 503 normalization, Flask and flask are the same project
+        return re.sub(r"[-_.]+", "-", name).lower()
+    return name
+
+
+def is_mapping_fresh(repo_name, resolved_at):
+    ttl = MAPPING_TTL if repo_name else NEGATIVE_MAPPING_TTL
+    return datetime.now(timezone.utc) - resolved_at.replace(tzinfo=timezone.utc) < ttl
+
+
+def get_cached_mapping(key):
+    mapping = mapping_lru.get(key)
+    if mapping is None:
+        return None
+    if not is_mapping_fresh(*mapping):
+        del mapping_lru[key]
+        return None
+    mapping_lru.move_to_end(key)
+    return mapping
+
+
+def cache_mapping(key, mapping):
+    mapping_lru[key] = mapping
+    mapping_lru.move_to_end(key)
+    while len(mapping_lru) > MAPPING_LRU_SIZE:
+        mapping_lru.popitem(last=False)
+
+
+def load_mappings(session, ecosystem, packages):
+    mappings = {}
+    for mapping_obj in session.query(PackageMapping) \
+            .filter(PackageMapping.ecosystem == ecosystem) \
+            .filter(PackageMapping.package.in_(packages)):
+        if is_mapping_fresh(mapping_obj.repo_name, mapping_obj.resolved_at):
+            mappings[mapping_obj.package] = (mapping_obj.repo_name, mapping_obj.resolved_at)
+    return mappings
+
+
+def store_mappings(session, ecosystem, mappings):
+    """Upsert package mappings, chats may resolve the same package concurrently"""
+    mapping_rows = [dict(ecosystem=ecosystem, package=package, repo_name=repo_name, resolved_at=resolved_at)
+                    for package, (repo_name, resolved_at) in mappings.items()]
+    dialect = session.get_bind().dialect.name
+    if dialect in insert_dialects:
+        statement = insert_dialects[dialect](PackageMapping)
+        statement = statement.on_conflict_do_update(
+            index_elements=['ecosystem', 'package'],
+            set_=dict(repo_name=statement.excluded.repo_name, resolved_at=statement.excluded.resolved_at),
+        )
+        session.execute(statement, mapping_rows)
+        return
+
+    for mapping_row in mapping_rows:
+        try:
+            with session.begin_nested():
+                session.merge(PackageMapping(**mapping_row))
+        except IntegrityError:
+            # Inserted meanwhile, merge updates it now
+            session.merge(PackageMapping(**mapping_row))
+
+
+def purge_mappings(session):
+    """Delete expired package mappings, returns number of deleted rows"""
+    now = aware_utcnow()
+    return session.query(PackageMapping) \
+        .filter(((PackageMapping.repo_name.is_not(None)) & (PackageMapping.resolved_at < now - MAPPING_TTL)) |
+                ((PackageMapping.repo_name.is_(None)) & (PackageMapping.resolved_at < now - NEGATIVE_MAPPING_TTL))) \
+        .delete(synchronize_session=False)
+
+
+async def resolve_packages(ecosystem, names):
+    """Resolve unique package names to GitHub repos, returns name -> (status, repo name).
+
+    Lookups go to the in-process LRU, then the package_mapping table and only then to the registry.
+    Both found and missing GitHub links are cached, registry errors are not. Empty names are skipped."""
+    names = [name for name in dict.fromkeys(names) if name]
+    packages = {name: normalize_package_name(ecosystem, name) for name in names}
+
+    mappings = {}
+    for package in set(packages.values()):
+        if mapping := get_cached_mapping((ecosystem, package)):
+            mappings[package] = mapping
+
+    missing = {package for package in packages.values() if package not in mappings}
+    if missing:
+        with app.app_context():
+            for package, mapping in load_mappings(db.session, ecosystem, missing).items():
+                mappings[package] = mapping
+                cache_mapping((ecosystem, package), mapping)
+
+    # One registry request per normalized name
+    unresolved = {package: name for name, package in packages.items() if package not in mappings}
+    fetched = {}
+    if unresolved:
+        results = await fetch_packages(ecosystem, list(unresolved.values()))
+        fetched = {package: results[name] for package, name in unresolved.items()}
+
+        now = aware_utcnow()
+        resolved = {package: (repo_name, now) for package, (status, repo_name) in fetched.items()
+                    if status == HTTPStatus.OK}
+        if resolved:
+            with app.app_context():
+                store_mappings(db.session, ecosystem, resolved)
+                db.session.commit()
+            for package, mapping in resolved.items():
+                cache_mapping((ecosystem, package), mapping)
+
+    app.logger.debug(f"Resolved {len(names)} {ecosystem} packages, {len(unresolved)} from registry")
+    return {name: (HTTPStatus.OK, mappings[package][0]) if package in mappings else fetched[package]
+            for name, package in packages.items()}
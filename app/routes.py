@@ -1,37 +1,72 @@
 from http import HTTPStatus
 
 from flask import Response, request
+from telegram.error import TelegramError
 
-from app import telegram_bot, app
-from app.models import Chat, Repo, Release
+from app import db, telegram_bot, app
+from app.models import Counter, Repo, aware_utcnow
+from app.repo_engine import ReleaseMessageCache
+from app.tasks import store_and_enqueue
+from app.webhook_engine import parse_event, verify_signature
 
 
 @app.route('/')
 async def index():
-    bot_me = await telegram_bot.get_me()
-    return (f'<a href="https://t.me/{bot_me.username}">{bot_me.first_name}</a> - a telegram bot for GitHub releases.'
+    try:
+        # Fetched on the first request and cached, web workers boot even when Telegram is unreachable
+        bot_me = await telegram_bot.get_me()
+        bot_link = f'<a href="https://t.me/{bot_me.username}">{bot_me.first_name}</a>'
+    except TelegramError as e:
+        app.logger.error(f"Can't get bot identity: {e}")
+        bot_link = 'release-bot'
+    return (f'{bot_link} - a telegram bot for GitHub releases.'
             '<br><br>'
             'Source code available at <a href="https://github.com/JanisV/release-bot">release-bot</a>')
 
 
 @app.route('/stats')
-async def stats():
-    users = Chat.query.count()
-    repos = Repo.query.count()
-    releases = Release.query.count()
+def stats():
+    counts = Counter.get_counts(db.session)
 
     statistics = {
-        "users": users,
-        "repos": repos,
-        "releases": releases,
+        "users": counts['chat'],
+        "repos": counts['repo'],
+        "releases": counts['release'],
     }
     return statistics
 
 
 @app.post("/telegram")
-async def telegram() -> Response:
+def telegram() -> Response:
     if app.config['SITE_URL']:
-        await telegram_bot.webhook(request.json)
+        telegram_bot.webhook(request.json)
         return Response(status=HTTPStatus.OK)
     else:
         return Response(status=HTTPStatus.NOT_IMPLEMENTED)
+
+
+@app.post("/github")
+def github_webhook() -> Response:
+    if not app.config['GITHUB_WEBHOOK_SECRET']:
+        return Response(status=HTTPStatus.NOT_IMPLEMENTED)
+    if not verify_signature(app.config['GITHUB_WEBHOOK_SECRET'], request.get_data(),
+                            request.headers.get('X-Hub-Signature-256')):
+        return Response(status=HTTPStatus.UNAUTHORIZED)
+
+    payload = request.get_json()
+    if 'repository' not in payload:
+        return Response(status=HTTPStatus.NO_CONTENT)
+    repo_obj = db.session.get(Repo, payload['repository']['id'])
+    if not repo_obj:
+        # Nobody is subscribed to the repo
+        return Response(status=HTTPStatus.NO_CONTENT)
+
+    # Any delivery, including ping, proves the webhook works and the repo needn't be polled
+    repo_obj.webhook_at = aware_utcnow()
+    db.session.commit()
+
+    snapshot = parse_event(request.headers.get('X-GitHub-Event'), payload, repo_obj)
+    if snapshot:
+        app.logger.info(f"GitHub webhook {request.headers.get('X-GitHub-Event')} event for {repo_obj.full_name}")
+        store_and_enqueue([snapshot], {repo_obj.id: repo_obj}, ReleaseMessageCache())
+    return Response(status=HTTPStatus.OK)
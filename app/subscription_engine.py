@@ -0,0 +1,116 @@
+import urllib.parse
+from datetime import datetime, timezone
+
+import github
+from sqlalchemy import func, select
+
+from app import app, github_obj
+from app.graphql_engine import GRAPHQL_BATCH_SIZE, fetch_repos_batch, parse_repo_node
+from app.models import ChatRepo, Repo
+from app.repo_engine import fetch_latest_release, store_release_batch
+
+STARRED_PAGE_SIZE = 100
+
+
+def count_chat_repos(session, chat):
+    return session.query(ChatRepo).filter(ChatRepo.chat_id == chat.id).count()
+
+
+def iter_starred_repos(github_login, since=None):
+    """Yield (starred_at, repo data) of user's stars from newest, stop at since watermark"""
+    page = 1
+    while True:
+        # PyGithub get_starred() can't sort stars nor return starred_at
+        headers, data = github_obj.requester.requestJsonAndCheck(
+            "GET", f"/users/{urllib.parse.quote(github_login)}/starred",
+            parameters={"sort": "created", "direction": "desc", "per_page": STARRED_PAGE_SIZE, "page": page},
+            headers={"Accept": "application/vnd.github.star+json"},
+        )
+        for item in data:
+            starred_at = datetime.fromisoformat(item['starred_at'])
+            if since and starred_at <= since:
+                return
+            yield starred_at, item['repo']
+
+        if len(data) < STARRED_PAGE_SIZE:
+            return
+        page += 1
+
+
+def seed_latest_releases(session, repo_objs):
+    """Store current releases of just added repos, so the first poll doesn't announce them"""
+    batch = []
+    if app.config['POLL_GRAPHQL']:
+        for i in range(0, len(repo_objs), GRAPHQL_BATCH_SIZE):
+            chunk = repo_objs[i:i + GRAPHQL_BATCH_SIZE]
+            try:
+                nodes = fetch_repos_batch([repo_obj.node_id for repo_obj in chunk])
+            except github.GithubException as e:
+                app.logger.error(f"GithubException in seed_latest_releases: {e}")
+                continue
+            for repo_obj in chunk:
+                if nodes[repo_obj.node_id]:
+                    _, release, prerelease, tag = parse_repo_node(nodes[repo_obj.node_id])
+                    batch.append((repo_obj, release, prerelease, tag))
+    else:
+        for repo_obj in repo_objs:
+            try:
+                release, prerelease, tag = fetch_latest_release(github_obj.get_repo(repo_obj.id))
+            except github.GithubException as e:
+                app.logger.error(f"GithubException for {repo_obj.full_name} in seed_latest_releases: {e}")
+                continue
+            batch.append((repo_obj, release, prerelease, tag))
+
+    store_release_batch(session, batch)
+
+
+def subscribe_repos(session, chat, repos_data, max_repos=0):
+    """Bulk subscribe chat to repos given as GitHub REST API data, returns data of newly subscribed repos"""
+    repos_data = list({repo_data['id']: repo_data for repo_data in repos_data}.values())
+    repo_ids = [repo_data['id'] for repo_data in repos_data]
+    subscribed_repo_ids = set(session.scalars(select(ChatRepo.repo_id)
+                                              .where(ChatRepo.chat_id == chat.id)
+                                              .where(ChatRepo.repo_id.in_(repo_ids))))
+    repos_data = [repo_data for repo_data in repos_data if repo_data['id'] not in subscribed_repo_ids]
+    if max_repos:
+        repos_data = repos_data[:max(max_repos - count_chat_repos(session, chat), 0)]
+    if not repos_data:
+        return []
+
+    stored_repo_ids = set(session.scalars(select(Repo.id).where(Repo.id.in_(repo_ids))))
+    new_repo_objs = [Repo(
+        id=repo_data['id'],
+        full_name=repo_data['full_name'],
+        node_id=repo_data['node_id'],
+        description=repo_data['description'],
+        link=repo_data['html_url'],
+        archived=repo_data['archived'],
+    ) for repo_data in repos_data if repo_data['id'] not in stored_repo_ids]
+    if new_repo_objs:
+        session.add_all(new_repo_objs)
+        seed_latest_releases(session, new_repo_objs)
+
+    session.add_all(ChatRepo(chat_id=chat.id, repo_id=repo_data['id']) for repo_data in repos_data)
+    return repos_data
+
+
+def sync_starred_repos(session, chat, github_login, incremental=False, max_repos=0):
+    """Subscribe chat to user's starred repos, incremental sync stops at the chat starred watermark.
+
+    Blocking, it pages through GitHub API. Returns data of newly subscribed repos, the caller commits."""
+    since = None
+    if incremental and chat.github_starred_at:
+        since = chat.github_starred_at.replace(tzinfo=timezone.utc)
+
+    starred = list(iter_starred_repos(github_login, since))
+    added = subscribe_repos(session, chat, [repo_data for _, repo_data in starred], max_repos)
+    if incremental and starred:
+        # Stars cut off by max_repos are older than the subscribed ones, the watermark mustn't pass them
+        starred_repo_ids = {repo_data['id'] for _, repo_data in starred}
+        subscribed_count = session.scalar(select(func.count())
+                                          .where(ChatRepo.chat_id == chat.id)
+                                          .where(ChatRepo.repo_id.in_(starred_repo_ids)))
+        if subscribed_count == len(starred_repo_ids):
+            chat.github_starred_at = starred[0][0]
+    return added
+
@@ -1,164 +1,467 @@
-import asyncio
+from datetime import datetime, timezone, timedelta
 
 import github
 import telegram
 from github.GitRelease import GitRelease
 from github.Tag import Tag
+from sqlalchemy import delete, exists, func, or_, select, true, update
+from sqlalchemy.exc import IntegrityError
 from telegram import LinkPreviewOptions
 from telegram.constants import ParseMode
 
 from app import models
-from app import github_obj, db, telegram_bot, scheduler
-from app.models import ChatRepo
-from app.repo_engine import store_latest_release, format_release_message
+from app import db, notifier, scheduler, coordinator
+from app.database import insert_dialects
+from app.graphql_engine import GraphQLRelease, GraphQLTag
+from app.lease_engine import HEARTBEAT_SECONDS
+from app.models import Chat, ChatRepo, aware_utcnow
+from app.poll_engine import (CADENCE_SAMPLE_SIZE, FEED_POLL_LIMIT, POLL_TICK_MINUTES, poll_repos, get_poll_budget,
+                             get_due_repos, load_validators, store_validators, schedule_next_polls,
+                             mark_updated_packages_due)
+from app.repo_engine import ReleaseMessageCache, store_release_batch
+from app.resolver import purge_mappings
+from app.subscription_engine import sync_starred_repos
 
+STORE_BATCH_SIZE = 100
+COMPACT_BATCH_SIZE = 500
+OUTBOX_BATCH_SIZE = 500
+ORPHAN_BATCH_SIZE = 500
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = timedelta(seconds=30)  # Doubled on every failed attempt
+OUTBOX_RETENTION = timedelta(days=7)  # Delivered rows are kept that long to reject repeated keys
+OUTBOX_INTERVAL_SECONDS = 30
 
-@scheduler.task('cron', id='poll_github', hour='*')
+
+def get_parse_mode(chat):
+    if chat.release_note_format in ("quote", "pre"):
+        return ParseMode.HTML
+    else:
+        return ParseMode.MARKDOWN_V2
+
+
+def notification_key(*parts):
+    return ":".join(str(part) for part in parts)
+
+
+def enqueue_notifications(session, outbox_rows):
+    """Insert Outbox rows given as column dicts in the caller's transaction, already queued keys are skipped.
+
+    Pollers and webhooks may queue the same notification concurrently, so the unique key index decides which wins."""
+    outbox_rows = list({outbox_row['key']: outbox_row for outbox_row in outbox_rows}.values())
+    dialect = session.get_bind().dialect.name
+    if dialect in insert_dialects:
+        statement = insert_dialects[dialect](models.Outbox).on_conflict_do_nothing(index_elements=['key'])
+        for i in range(0, len(outbox_rows), OUTBOX_BATCH_SIZE):
+            session.execute(statement, outbox_rows[i:i + OUTBOX_BATCH_SIZE])
+        return
+
+    for outbox_row in outbox_rows:
+        try:
+            with session.begin_nested():
+                session.add(models.Outbox(**outbox_row))
+        except IntegrityError:
+            # Already queued
+            pass
+
+
+def wake_delivery():
+    # Delivery runs as its own job, so polling never waits for Telegram.
+    # Processes without the poller role leave queued notifications to the poller's next run
+    if scheduler.running:
+        scheduler.modify_job('deliver_notifications', next_run_time=datetime.now(timezone.utc))
+
+
+def get_outbox_message(outbox_obj):
+    if outbox_obj.preview_url:
+        link_preview_options = LinkPreviewOptions(url=outbox_obj.preview_url, prefer_small_media=True)
+    else:
+        link_preview_options = LinkPreviewOptions(is_disabled=True)
+    return dict(chat_id=outbox_obj.chat_id,
+                text=outbox_obj.text,
+                parse_mode=outbox_obj.parse_mode,
+                link_preview_options=link_preview_options)
+
+
+def deliver_outbox(session):
+    """Send due outbox rows OUTBOX_BATCH_SIZE at a time, failed ones are retried with exponential backoff.
+
+    Returns (sent, failed) counts"""
+    sent_count = 0
+    failed_count = 0
+    while True:
+        outbox_objs = session.query(models.Outbox) \
+            .filter(models.Outbox.next_attempt_at <= aware_utcnow()) \
+            .order_by(models.Outbox.id) \
+            .limit(OUTBOX_BATCH_SIZE) \
+            .all()
+        if not outbox_objs:
+            return sent_count, failed_count
+
+        results = notifier.send_many([get_outbox_message(outbox_obj) for outbox_obj in outbox_objs])
+        now = aware_utcnow()
+        blocked_chat_ids = set()
+        for outbox_obj, result in zip(outbox_objs, results):
+            if result is None:
+                outbox_obj.sent_at = now
+                outbox_obj.next_attempt_at = None
+                sent_count += 1
+                continue
+
+            outbox_obj.attempts += 1
+            if isinstance(result, telegram.error.Forbidden):
+                blocked_chat_ids.add(outbox_obj.chat_id)
+            elif (isinstance(result, telegram.error.BadRequest) or
+                  outbox_obj.attempts >= OUTBOX_MAX_ATTEMPTS):
+                # Won't get better with retries
+                scheduler.app.logger.error(f"Can't send notification to chat {outbox_obj.chat_id}: {result}")
+                outbox_obj.next_attempt_at = None
+                failed_count += 1
+            else:
+                outbox_obj.next_attempt_at = now + OUTBOX_RETRY_DELAY * 2 ** (outbox_obj.attempts - 1)
+
+        for chat_id in blocked_chat_ids:
+            scheduler.app.logger.info('Bot was blocked by the user')
+            # Its pending outbox rows go with it, unless the chat is already gone
+            chat = session.get(Chat, chat_id)
+            if chat:
+                session.delete(chat)
+        session.commit()
+
+
+def purge_outbox(session):
+    """Delete rows delivered or given up over OUTBOX_RETENTION ago, returns their number"""
+    return session.execute(delete(models.Outbox)
+                           .where(models.Outbox.next_attempt_at.is_(None))
+                           .where(models.Outbox.created_at < aware_utcnow() - OUTBOX_RETENTION),
+                           execution_options={'synchronize_session': False}).rowcount
+
+
+def store_and_enqueue(snapshots, repo_objs_by_id, release_messages):
+    """Store fetched snapshots and queue their notifications in one transaction"""
+    for snapshot in snapshots:
+        store_validators(db.session, snapshot.repo_id, snapshot.validators)
+    events = store_release_batch(db.session, [(repo_objs_by_id[snapshot.repo_id],
+                                               snapshot.release, snapshot.prerelease, snapshot.tag)
+                                              for snapshot in snapshots])
+
+    outbox_rows = []
+    for repo_obj, release_or_tag, prerelease in events:
+        if isinstance(release_or_tag, (GitRelease, GraphQLRelease)):
+            release = release_or_tag
+
+            outbox_rows += [dict(key=notification_key("release", repo_obj.id, release.id,
+                                                      release.last_modified_datetime, chat.id),
+                                 chat_id=chat.id,
+                                 text=release_messages.get(chat, repo_obj, release),
+                                 parse_mode=get_parse_mode(chat),
+                                 preview_url=repo_obj.link)
+                            for chat in repo_obj.chats]
+        elif isinstance(release_or_tag, (Tag, GraphQLTag)):
+            tag = release_or_tag
+
+            # TODO: Use tag.message as release_body text
+            message = (f"<a href='{repo_obj.link}'>{repo_obj.full_name}</a>:\n"
+                       f"<code>{tag.name}</code>")
+
+            outbox_rows += [dict(key=notification_key("tag", repo_obj.id, tag.name, chat.id),
+                                 chat_id=chat.id,
+                                 text=message,
+                                 parse_mode=ParseMode.HTML,
+                                 preview_url=repo_obj.link)
+                            for chat in repo_obj.chats]
+        if isinstance(prerelease, (GitRelease, GraphQLRelease)):
+            release = prerelease
+
+            chats = db.session.query(Chat).join(ChatRepo) \
+                .filter(ChatRepo.repo_id == repo_obj.id).filter(ChatRepo.process_pre_releases == true()) \
+                .all()
+            outbox_rows += [dict(key=notification_key("release", repo_obj.id, release.id,
+                                                      release.last_modified_datetime, chat.id),
+                                 chat_id=chat.id,
+                                 text=release_messages.get(chat, repo_obj, release),
+                                 parse_mode=get_parse_mode(chat),
+                                 preview_url=repo_obj.link)
+                            for chat in chats]
+
+    enqueue_notifications(db.session, outbox_rows)
+    db.session.commit()
+    if outbox_rows:
+        wake_delivery()
+
+
+@scheduler.task('interval', id='heartbeat', seconds=HEARTBEAT_SECONDS, next_run_time=datetime.now(timezone.utc))
+def heartbeat():
+    with scheduler.app.app_context():
+        coordinator.heartbeat(db.session)
+
+
+@scheduler.task('cron', id='poll_github', minute=f'*/{POLL_TICK_MINUTES}')
 def poll_github():
     with scheduler.app.app_context():
-        for repo_obj in models.Repo.query.all():
-            try:
-                scheduler.app.logger.info(f"Poll GitHub repo {repo_obj.full_name}")
-                repo = github_obj.get_repo(repo_obj.id)
-            except github.UnknownObjectException as e:
+        if not coordinator.shards:
+            return
+
+        try:
+            graphql_budget, rest_budget = get_poll_budget()
+        except github.GithubException as e:
+            scheduler.app.logger.error(f"GithubException in poll_github rate limit check: {e}")
+            return
+        # Rate limit is shared by all workers, each one spends the part of its shards
+        graphql_budget = graphql_budget * len(coordinator.shards) // coordinator.shard_count
+        rest_budget = rest_budget * len(coordinator.shards) // coordinator.shard_count
+
+        if coordinator.leader:
+            due_count = mark_updated_packages_due(db.session)
+            if due_count:
+                scheduler.app.logger.info(f"{due_count} repos are due after package registry updates")
+
+        shard_condition = coordinator.shard_filter(models.Repo.id)
+        if scheduler.app.config['POLL_ATOM']:
+            # Feeds are free, rate limit budget only bounds REST calls for repos with changed feeds
+            repo_objs = get_due_repos(db.session, FEED_POLL_LIMIT, shard_condition)
+        else:
+            repo_objs = get_due_repos(db.session, graphql_budget + rest_budget, shard_condition)
+        repo_ids = [repo_obj.id for repo_obj in repo_objs]
+        deferred_repo_ids = set()
+        validators = load_validators(db.session, repo_ids)
+        repo_objs_by_id = {repo_obj.id: repo_obj for repo_obj in repo_objs}
+        release_messages = ReleaseMessageCache()
+        batch = []
+        for repo_obj, snapshot in poll_repos(repo_objs, validators, rest_budget, graphql_budget):
+            scheduler.app.logger.info(f"Poll GitHub repo {repo_obj.full_name}")
+            if snapshot.deferred:
+                # Stays due, so it is fetched first on the next tick
+                deferred_repo_ids.add(repo_obj.id)
+                continue
+            elif snapshot.deleted:
                 message = f"GitHub repo {repo_obj.full_name} has been deleted"
-                for chat in repo_obj.chats:
-                    try:
-                        asyncio.run(telegram_bot.send_message(chat_id=chat.id,
-                                                              text=message,
-                                                              disable_web_page_preview=True))
-                    except telegram.error.Forbidden as e:
-                        pass
+                enqueue_notifications(db.session, [dict(key=notification_key("deleted", repo_obj.id, chat.id),
+                                                        chat_id=chat.id,
+                                                        text=message)
+                                                   for chat in repo_obj.chats])
 
                 scheduler.app.logger.info(message)
                 db.session.delete(repo_obj)
                 db.session.commit()
+                wake_delivery()
                 continue
-            except github.GithubException as e:
-                scheduler.app.logger.error(f"GithubException for {repo_obj.full_name} in poll_github: {e}")
+            elif snapshot.error:
+                scheduler.app.logger.error(f"GithubException for {repo_obj.full_name} in poll_github: "
+                                           f"{snapshot.error}")
                 continue
 
-            if repo.archived and not repo_obj.archived:
+            if snapshot.node_id and repo_obj.node_id != snapshot.node_id:
+                repo_obj.node_id = snapshot.node_id
+
+            if snapshot.archived and not repo_obj.archived:
                 message = f"GitHub repo <b>{repo_obj.full_name}</b> has been archived"
-                for chat in repo_obj.chats:
-                    try:
-                        asyncio.run(telegram_bot.send_message(chat_id=chat.id,
-                                                              text=message,
-                                                              parse_mode=ParseMode.HTML,
-                                                              link_preview_options=LinkPreviewOptions(
-                                                                  url=repo_obj.link,
-                                                                  prefer_small_media=True)
-                                                              ))
-                    except telegram.error.Forbidden as e:
-                        pass
+                enqueue_notifications(db.session, [dict(key=notification_key("archived", repo_obj.id,
+                                                                             chat.id),
+                                                        chat_id=chat.id,
+                                                        text=message,
+                                                        parse_mode=ParseMode.HTML,
+                                                        preview_url=repo_obj.link)
+                                                   for chat in repo_obj.chats])
 
                 scheduler.app.logger.info(message)
-                repo_obj.archived = repo.archived
-                db.session.commit()
-            elif not repo.archived and repo_obj.archived:
-                repo_obj.archived = repo.archived
-                db.session.commit()
+                repo_obj.archived = snapshot.archived
+            elif snapshot.archived is False and repo_obj.archived:
+                # Unarchived, archived is None when the repo replied 304
+                repo_obj.archived = snapshot.archived
+
+            if snapshot.not_modified:
+                # Feeds may have changed while release endpoints replied 304, keep their validators anyway
+                store_validators(db.session, snapshot.repo_id, snapshot.validators)
+                continue
+
+            batch.append(snapshot)
+            if len(batch) >= STORE_BATCH_SIZE:
+                store_and_enqueue(batch, repo_objs_by_id, release_messages)
+                batch = []
+
+        if batch:
+            store_and_enqueue(batch, repo_objs_by_id, release_messages)
 
-            release_or_tag, prerelease = store_latest_release(db.session, repo, repo_obj)
-            if isinstance(release_or_tag, GitRelease):
-                release = release_or_tag
-
-                for chat in repo_obj.chats:
-                    message = format_release_message(chat, repo, release)
-
-                    if chat.release_note_format in ("quote", "pre"):
-                        parse_mode = ParseMode.HTML
-                    else:
-                        parse_mode = ParseMode.MARKDOWN_V2
-
-                    try:
-                        asyncio.run(telegram_bot.send_message(chat_id=chat.id,
-                                                              text=message,
-                                                              parse_mode=parse_mode,
-                                                              link_preview_options=LinkPreviewOptions(
-                                                                  url=repo_obj.link,
-                                                                  prefer_small_media=True)
-                                                              ))
-                    except telegram.error.Forbidden as e:
-                        scheduler.app.logger.info('Bot was blocked by the user')
-                        db.session.delete(chat)
-                        db.session.commit()
-            elif isinstance(release_or_tag, Tag):
-                tag = release_or_tag
-
-                # TODO: Use tag.message as release_body text
-                message = (f"<a href='{repo.html_url}'>{repo.full_name}</a>:\n"
-                           f"<code>{tag.name}</code>")
-
-                for chat in repo_obj.chats:
-                    try:
-                        asyncio.run(telegram_bot.send_message(chat_id=chat.id,
-                                                              text=message,
-                                                              parse_mode=ParseMode.HTML,
-                                                              link_preview_options=LinkPreviewOptions(
-                                                                  url=repo_obj.link,
-                                                                  prefer_small_media=True)
-                                                              ))
-                    except telegram.error.Forbidden as e:
-                        scheduler.app.logger.info('Bot was blocked by the user')
-                        db.session.delete(chat)
-                        db.session.commit()
-            if isinstance(prerelease, GitRelease):
-                release = prerelease
-
-                for chat in repo_obj.chats:
-                    chat_repo = db.session.query(ChatRepo) \
-                        .filter(ChatRepo.chat_id == chat.id).filter(ChatRepo.repo_id == repo_obj.id) \
-                        .first()
-                    if not chat_repo.process_pre_releases:
-                        break
-
-                    message = format_release_message(chat, repo, release)
-
-                    if chat.release_note_format in ("quote", "pre"):
-                        parse_mode = ParseMode.HTML
-                    else:
-                        parse_mode = ParseMode.MARKDOWN_V2
-
-                    try:
-                        asyncio.run(telegram_bot.send_message(chat_id=chat.id,
-                                                              text=message,
-                                                              parse_mode=parse_mode,
-                                                              link_preview_options=LinkPreviewOptions(
-                                                                  url=repo_obj.link,
-                                                                  prefer_small_media=True)
-                                                              ))
-                    except telegram.error.Forbidden as e:
-                        scheduler.app.logger.info('Bot was blocked by the user')
-                        db.session.delete(chat)
-                        db.session.commit()
+        schedule_next_polls(db.session, [repo_id for repo_id in repo_ids if repo_id not in deferred_repo_ids])
+        db.session.commit()
+        wake_delivery()
+
+
+@scheduler.task('interval', id='deliver_notifications', seconds=OUTBOX_INTERVAL_SECONDS)
+def deliver_notifications():
+    if not coordinator.leader:
+        return
+
+    with scheduler.app.app_context():
+        sent_count, failed_count = deliver_outbox(db.session)
+        if sent_count or failed_count:
+            scheduler.app.logger.info(f"Delivered {sent_count} notifications, {failed_count} failed")
 
 
 @scheduler.task('cron', id='poll_github_user', hour='*/8')
 def poll_github_user():
+    if not coordinator.leader:
+        return
+
     with scheduler.app.app_context():
         for chat in models.Chat.query.filter(models.Chat.github_username.is_not(None)).all():
+            github_username = chat.github_username
             try:
-                github_user = github_obj.get_user(chat.github_username)
+                added = sync_starred_repos(db.session, chat, github_username, True,
+                                           scheduler.app.config['MAX_REPOS_PER_CHAT'])
             except github.GithubException as e:
-                scheduler.app.logger.error(f"Can't found user '{chat.github_username}'")
+                db.session.rollback()
+                scheduler.app.logger.error(f"Can't sync starred repos of user '{github_username}': {e}")
                 continue
 
-            try:
-                asyncio.run(telegram_bot.add_starred_repos(chat.id, github_user, telegram_bot))
-            except telegram.error.Forbidden as e:
-                scheduler.app.logger.info('Bot was blocked by the user')
-                db.session.delete(chat)
-                db.session.commit()
+            if added:
+                # Queued with the subscriptions, blocked chats are removed by the delivery
+                enqueue_notifications(db.session, [dict(key=notification_key("starred", chat.id, added[0]['id'],
+                                                                             len(added)),
+                                                        chat_id=chat.id,
+                                                        text=f"Added {len(added)} starred repos of GitHub user "
+                                                             f"{github_username}.")])
+            db.session.commit()
+        wake_delivery()
+
+
+def delete_orphan_repos(session, dry_run=False):
+    """Delete repos without subscribers together with their releases and cache in one transaction.
+
+    Orphans are selected once and locked, so a repo subscribed meanwhile keeps its releases and cache.
+    Returns (repo_count, release_count), with dry_run only counts them."""
+    query = select(models.Repo.id).where(~exists().where(models.ChatRepo.repo_id == models.Repo.id))
+    if not dry_run:
+        query = query.with_for_update()
+    orphan_repo_ids = session.scalars(query).all()
+
+    repo_count = 0
+    release_count = 0
+    for i in range(0, len(orphan_repo_ids), ORPHAN_BATCH_SIZE):
+        repo_ids = orphan_repo_ids[i:i + ORPHAN_BATCH_SIZE]
+        if dry_run:
+            repo_count += len(repo_ids)
+            release_count += session.scalar(select(func.count()).where(models.Release.repo_id.in_(repo_ids)))
+            continue
+
+        # Checked again, SQLite ignores FOR UPDATE but from the first DELETE on its write lock keeps subscriptions out
+        repo_ids = session.scalars(delete(models.Repo)
+                                   .where(models.Repo.id.in_(repo_ids))
+                                   .where(~exists().where(models.ChatRepo.repo_id == models.Repo.id))
+                                   .returning(models.Repo.id),
+                                   execution_options={'synchronize_session': False}).all()
+        repo_count += len(repo_ids)
+        release_count += session.execute(delete(models.Release).where(models.Release.repo_id.in_(repo_ids)),
+                                         execution_options={'synchronize_session': False}).rowcount
+        session.execute(delete(models.HttpCache).where(models.HttpCache.repo_id.in_(repo_ids)),
+                        execution_options={'synchronize_session': False})
+    if not dry_run:
+        session.commit()
+    return repo_count, release_count
 
 
 @scheduler.task('cron', id='clear_db', week='*')
-def clear_db():
+def clear_db(dry_run=False):
+    if not coordinator.leader:
+        return
+
     with scheduler.app.app_context():
-        for repo_obj in models.Repo.query.all():
-            #  TODO: Use sqlalchemy_utils.auto_delete_orphans
-            if repo_obj.is_orphan():
-                scheduler.app.logger.info(f"Delete orphaned GitHub repo {repo_obj.full_name}")
-                db.session.delete(repo_obj)
-                db.session.commit()
-                continue
+        repo_count, release_count = delete_orphan_repos(db.session, dry_run)
+        scheduler.app.logger.info(f"{"Found" if dry_run else "Deleted"} {repo_count} orphaned GitHub repos "
+                                  f"with {release_count} releases")
+
+
+def compact_releases(session, keep):
+    """Delete all but the newest keep releases of every repo, COMPACT_BATCH_SIZE repos per transaction.
+
+    Rows referenced by Repo latest pointers are always kept. Returns the number of deleted releases."""
+    deleted_count = 0
+    last_repo_id = None
+    while True:
+        query = select(models.Repo.id).order_by(models.Repo.id).limit(COMPACT_BATCH_SIZE)
+        if last_repo_id is not None:
+            query = query.where(models.Repo.id > last_repo_id)
+        repo_ids = session.scalars(query).all()
+        if not repo_ids:
+            return deleted_count
+        last_repo_id = repo_ids[-1]
+
+        ranked_releases = select(models.Release.id,
+                                 func.row_number().over(partition_by=models.Release.repo_id,
+                                                        order_by=models.Release.id.desc()).label('rank')) \
+            .where(models.Release.repo_id.in_(repo_ids)) \
+            .subquery()
+        deleted_count += session.execute(
+            delete(models.Release)
+            .where(models.Release.id.in_(select(ranked_releases.c.id).where(ranked_releases.c.rank > keep)))
+            .where(~exists()
+                   .where(models.Repo.id == models.Release.repo_id)
+                   .where(or_(models.Repo.latest_release_id == models.Release.id,
+                              models.Repo.latest_stable_release_id == models.Release.id))),
+            execution_options={'synchronize_session': False}).rowcount
+        session.commit()
+
+
+def reconcile_counters(session):
+    """Compare trigger maintained counters with the row counts of their tables and correct the ones that drifted.
+
+    Returns {table name: drift} of the corrected counters, databases without counter triggers have none."""
+    drifts = {}
+    for model in (models.Chat, models.Repo, models.ChatRepo, models.Release):
+        name = model.__tablename__
+        # Locked first, so writers in flight commit before the count and the next ones wait for the correction
+        values = session.scalars(select(models.Counter.value)
+                                 .where(models.Counter.name == name)
+                                 .with_for_update()).all()
+        if not values:
+            continue
+
+        drift = session.scalar(select(func.count()).select_from(model)) - sum(values)
+        if drift:
+            session.execute(update(models.Counter)
+                            .where(models.Counter.name == name, models.Counter.slot == 0)
+                            .values(value=models.Counter.value + drift),
+                            execution_options={'synchronize_session': False})
+            drifts[name] = drift
+    session.commit()
+    return drifts
+
+
+def vacuum_sqlite(engine):
+    """Give pages freed by compaction back to the file system"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:  # INCREMENTAL
+            connection.exec_driver_sql("PRAGMA incremental_vacuum")
+        else:
+            # auto_vacuum mode of existing database only changes on full VACUUM, it's done once
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+
+
+@scheduler.task('cron', id='compact_db', day='*')
+def compact_db():
+    if not coordinator.leader:
+        return
+
+    with scheduler.app.app_context():
+        deleted_count = purge_mappings(db.session)
+        db.session.commit()
+        scheduler.app.logger.info(f"Deleted {deleted_count} expired package mappings")
+
+        deleted_count = purge_outbox(db.session)
+        db.session.commit()
+        scheduler.app.logger.info(f"Deleted {deleted_count} delivered notifications")
+
+        for name, drift in reconcile_counters(db.session).items():
+            scheduler.app.logger.warning(f"Corrected {name} row counter by {drift:+}")
+
+        if not scheduler.app.config['RELEASE_RETENTION']:
+            return
+
+        # Poll scheduler learns release cadence from the newest releases
+        keep = max(scheduler.app.config['RELEASE_RETENTION'], CADENCE_SAMPLE_SIZE)
+        deleted_count = compact_releases(db.session, keep)
+        scheduler.app.logger.info(f"Deleted {deleted_count} releases beyond the newest {keep} per repo")
+
+        if db.engine.dialect.name == 'sqlite':
+            vacuum_sqlite(db.engine)
@@ -3,16 +3,15 @@ import json
 import logging
 import re
 import threading
-import urllib.parse
+from http import HTTPStatus
 
 import github
 import requirements
 import telegram
-import urllib3
-from sqlalchemy import true
+from sqlalchemy import case, true, tuple_
 from telegram import Chat as TelegramChat
 from telegram import Update, LinkPreviewOptions, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.constants import InlineKeyboardMarkupLimit, ParseMode
+from telegram.constants import InlineKeyboardMarkupLimit, MessageLimit, ParseMode
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
@@ -24,13 +23,16 @@ from telegram.ext import (
 
 from app import github_obj, db
 from app._version import __version__
-from app.models import Chat, Repo, ChatRepo, Release
+from app.models import Chat, Repo, ChatRepo, Release, Counter
 from app.repo_engine import store_latest_release
+from app.resolver import RESOLVE_CONCURRENCY, github_link_pattern, normalize_package_name, resolve_packages
+from app.subscription_engine import count_chat_repos, subscribe_repos, sync_starred_repos
 
 MAX_UPLOADED_FILE_SIZE = 1024 * 10  # 10kB
+LIST_PAGE_SIZE = 500
+UPDATE_CONCURRENCY = 16
 
 direct_pattern = re.compile(".+/.+")
-github_link_pattern = re.compile("https://github.com/([^/]+/[^/]+)/?")
 pypi_link_pattern = re.compile("https://pypi.org/project/(.+)/")
 npm_link_pattern = re.compile("https://www.npmjs.com/package/(.+)")
 
@@ -47,22 +49,44 @@ def get_or_create_chat(session, chat_id):
     return chat
 
 
-def get_latest_chat_release(session, chat, repo):
-    if repo.releases:
-        chat_repo = session.query(ChatRepo) \
-            .filter(ChatRepo.chat_id == chat.id).filter(ChatRepo.repo_id == repo.id) \
-            .first()
-
-        if chat_repo.process_pre_releases:
-            return repo.releases[-1]
-        else:
-            return session.query(Release) \
-                .filter(Release.repo_id == repo.id) \
-                .filter(Release.pre_release != true()) \
-                .order_by(Release.id.desc()) \
-                .first()
-    else:
-        return None
+def link_repo_packages(session, ecosystem, packages_by_repo_id):
+    """Remember packages repos were subscribed through, registry feeds then tell when to poll them"""
+    for repo_obj in session.query(Repo) \
+            .filter(Repo.id.in_(packages_by_repo_id)) \
+            .filter(Repo.package_name.is_(None)):
+        repo_obj.package_ecosystem = ecosystem
+        repo_obj.package_name = packages_by_repo_id[repo_obj.id]
+
+
+def iter_chat_repos(session, chat):
+    """Yield chat repos ordered by full name, LIST_PAGE_SIZE rows per query using keyset pagination"""
+    last_key = None
+    while True:
+        query = session.query(Repo.id, Repo.full_name, Repo.link) \
+            .join(ChatRepo, ChatRepo.repo_id == Repo.id) \
+            .filter(ChatRepo.chat_id == chat.id)
+        if last_key:
+            query = query.filter(tuple_(Repo.full_name, Repo.id) > last_key)
+        rows = query.order_by(Repo.full_name, Repo.id).limit(LIST_PAGE_SIZE).all()
+        if not rows:
+            return
+
+        yield from rows
+        last_key = (rows[-1].full_name, rows[-1].id)
+
+
+def get_chat_repos_page(session, chat, offset, limit):
+    """Page of (repo, process_pre_releases, latest release for the chat) rows, with one query"""
+    latest_release_id = case((ChatRepo.process_pre_releases == true(), Repo.latest_release_id),
+                             else_=Repo.latest_stable_release_id)
+    return session.query(Repo, ChatRepo.process_pre_releases, Release) \
+        .join(ChatRepo, ChatRepo.repo_id == Repo.id) \
+        .outerjoin(Release, Release.id == latest_release_id) \
+        .filter(ChatRepo.chat_id == chat.id) \
+        .order_by(Repo.full_name, Repo.id) \
+        .offset(offset) \
+        .limit(limit) \
+        .all()
 
 
 class TelegramBot(object):
@@ -70,6 +94,8 @@ class TelegramBot(object):
     def __init__(self, app=None):
         self.application = None
         self.app = None
+        self.loop = None
+        self.me = None
 
         if app:
             self.init_app(app)
@@ -79,7 +105,10 @@ class TelegramBot(object):
 
         self.app = app
 
-        self.application = Application.builder().token(self.app.config['TELEGRAM_BOT_TOKEN']).build()
+        self.application = Application.builder() \
+            .token(self.app.config['TELEGRAM_BOT_TOKEN']) \
+            .concurrent_updates(UPDATE_CONCURRENCY) \
+            .build()
 
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("about", self.about_command))
@@ -156,8 +185,15 @@ class TelegramBot(object):
             with self.app.app_context():
                 text = "Your subscriptions:\n"
                 chat = get_or_create_chat(db.session, chat_id)
-                for i, repo in enumerate(chat.repos):
-                    text += f"{i + 1}. <b><a href='{repo.link}'>{repo.full_name}</a></b>\n"
+                for i, repo in enumerate(iter_chat_repos(db.session, chat)):
+                    line = f"{i + 1}. <b><a href='{repo.link}'>{repo.full_name}</a></b>\n"
+                    if len(text) + len(line) > MessageLimit.MAX_TEXT_LENGTH:
+                        await update.message.reply_html(
+                            text,
+                            link_preview_options=LinkPreviewOptions(is_disabled=True),
+                        )
+                        text = ""
+                    text += line
 
             await update.message.reply_html(
                 text,
@@ -171,12 +207,14 @@ class TelegramBot(object):
         keyboard = []
         with self.app.app_context():
             chat = get_or_create_chat(db.session, chat_id)
-            if len(chat.repos) == 0:
+            # One extra row tells whether there is a next page
+            rows = get_chat_repos_page(db.session, chat, curr_page * lines, lines + 1)
+            if not rows and curr_page == 0:
                 return None
+            has_next_page = len(rows) > lines
 
-            for repo in chat.repos[curr_page * lines:(curr_page + 1) * lines]:
+            for repo, process_pre_releases, latest_release in rows[:lines]:
                 repo_name = repo.full_name.split('/')[1]
-                latest_release = get_latest_chat_release(db.session, chat, repo)
                 if latest_release:
                     repo_current_tag = latest_release.tag_name
                     if latest_release.link:
@@ -186,10 +224,7 @@ class TelegramBot(object):
                 else:
                     repo_current_tag = "N/A"
                     repo_current_tag_url = f"{repo.link}/releases"
-                chat_repo = db.session.query(ChatRepo) \
-                    .filter(ChatRepo.chat_id == chat.id).filter(ChatRepo.repo_id == repo.id) \
-                    .first()
-                process_pre_releases = "✔️" if chat_repo.process_pre_releases else "❌"
+                process_pre_releases = "✔️" if process_pre_releases else "❌"
                 keyboard.append([InlineKeyboardButton(repo_name, url=repo.link),
                                  InlineKeyboardButton(repo_current_tag, url=repo_current_tag_url),
                                  InlineKeyboardButton(f"Pre: {process_pre_releases}️️",
@@ -202,7 +237,7 @@ class TelegramBot(object):
 
             assert btn_per_line == len(keyboard[0])
 
-            if len(chat.repos) > (curr_page + 1) * lines:
+            if has_next_page:
                 if curr_page > 0:
                     keyboard.append([InlineKeyboardButton("⬅️ Prev", callback_data=f"prev-{curr_page - 1}"),
                                      InlineKeyboardButton("Cancel", callback_data="cancel"),
@@ -229,12 +264,12 @@ class TelegramBot(object):
             else:
                 await update.message.reply_text("You are haven't repos yet.")
 
-    async def add_repo(self, chat_id, repo, bot, silent=False) -> None:
+    async def add_repo(self, chat_id, repo, bot, silent=False, package=None) -> None:
         with self.app.app_context():
             chat = get_or_create_chat(db.session, chat_id)
 
             if self.app.config['MAX_REPOS_PER_CHAT']:
-                if len(chat.repos) >= self.app.config['MAX_REPOS_PER_CHAT']:  # TODO: Use SQL COUNT instead Python len
+                if count_chat_repos(db.session, chat) >= self.app.config['MAX_REPOS_PER_CHAT']:
                     if not silent:
                         await bot.send_message(
                             chat_id=chat.id,
@@ -247,15 +282,19 @@ class TelegramBot(object):
                 repo_obj = Repo(
                     id=repo.id,
                     full_name=repo.full_name,
+                    node_id=repo.raw_data.get('node_id'),
                     description=repo.description,
                     link=repo.html_url,
                     archived=repo.archived,
                 )
 
-                store_latest_release(db.session, repo, repo_obj)
-
                 db.session.add(repo_obj)
-                db.session.commit()
+                # PyGithub is blocking, keep the bot event loop free
+                await asyncio.to_thread(store_latest_release, db.session, repo, repo_obj)
+
+            if package and not repo_obj.package_name:
+                repo_obj.package_ecosystem, repo_obj.package_name = package
+            db.session.commit()
 
             if chat in repo_obj.chats:
                 if not silent:
@@ -301,10 +340,20 @@ class TelegramBot(object):
                             prefer_small_media=True)
                     )
 
-    async def add_starred_repos(self, chat_id, github_user, bot) -> None:
-        repos = github_user.get_starred()
-        for repo in repos:
-            await self.add_repo(chat_id, repo, bot, True)
+    async def add_starred_repos(self, chat_id, github_login, bot, incremental=False) -> None:
+        """Subscribe chat to user's starred repos, incremental sync stops at the chat starred watermark"""
+        with self.app.app_context():
+            chat = get_or_create_chat(db.session, chat_id)
+            # Pages through GitHub API, keep the bot event loop free
+            added = await asyncio.to_thread(sync_starred_repos, db.session, chat, github_login, incremental,
+                                            self.app.config['MAX_REPOS_PER_CHAT'])
+            db.session.commit()
+
+        if added:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=f"Added {len(added)} starred repos of GitHub user {github_login}.",
+            )
 
     async def button(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if chat_id := self._get_chat_id(update):
@@ -321,13 +370,14 @@ class TelegramBot(object):
                     chat = get_or_create_chat(db.session, chat_id)
                     github_username = chat.github_username
                     chat.github_username = None
+                    chat.github_starred_at = None
                     db.session.commit()
 
                     await query.edit_message_text(text=f"Unsubscribed from user {github_username}.")
             elif query.data.startswith("subscribe_user-"):
                 github_user_name = query.data.split("-", 1)[1]
                 try:
-                    github_user = github_obj.get_user(github_user_name)
+                    github_user = await asyncio.to_thread(github_obj.get_user, github_user_name)
                 except github.GithubException as e:
                     await update.message.reply_text("Error: User not founded.")
                     return
@@ -335,20 +385,21 @@ class TelegramBot(object):
                 with self.app.app_context():
                     chat = get_or_create_chat(db.session, chat_id)
                     chat.github_username = github_user.login
+                    chat.github_starred_at = None
                     db.session.commit()
 
                     await query.edit_message_text(text=f"Subscribed to user {github_user.login} starred repos.")
 
-                await self.add_starred_repos(chat_id, github_user, update.callback_query.get_bot())
+                await self.add_starred_repos(chat_id, github_user.login, update.callback_query.get_bot(), True)
             elif query.data.startswith("add_repos-"):
                 github_user_name = query.data.split("-", 1)[1]
                 try:
-                    github_user = github_obj.get_user(github_user_name)
+                    github_user = await asyncio.to_thread(github_obj.get_user, github_user_name)
                 except github.GithubException as e:
                     await update.message.reply_text("Error: User not founded.")
                     return
 
-                await self.add_starred_repos(chat_id, github_user, update.callback_query.get_bot())
+                await self.add_starred_repos(chat_id, github_user.login, update.callback_query.get_bot())
 
                 await query.delete_message()
             elif query.data == "release_note_format":
@@ -473,19 +524,18 @@ class TelegramBot(object):
 
             github_user_name = context.args[0]
             try:
-                github_user = github_obj.get_user(github_user_name)
+                github_user = await asyncio.to_thread(github_obj.get_user, github_user_name)
+                starred_count = await asyncio.to_thread(lambda: github_user.get_starred().totalCount)
             except github.GithubException as e:
                 await update.message.reply_text("Sorry, I can't find that user.")
                 return
 
-            starred = github_user.get_starred()
-
             keyboard = [[InlineKeyboardButton("Subscribe user", callback_data=f"subscribe_user-{github_user_name}")],
                         [InlineKeyboardButton("Add user's repos", callback_data=f"add_repos-{github_user_name}")],
                         [InlineKeyboardButton("Cancel", callback_data="cancel")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await update.message.reply_text(f"User {github_user_name} has {starred.totalCount} starred repos. "
+            await update.message.reply_text(f"User {github_user_name} has {starred_count} starred repos. "
                                             "Subscribe to the user or add user's repos once?",
                                             reply_markup=reply_markup)
 
@@ -503,61 +553,13 @@ class TelegramBot(object):
         """Send a message when the command /stats is issued."""
         if self._get_chat_id(update):
             with (self.app.app_context()):
-                release_count = db.session.query(Release).count()
-                repo_count = db.session.query(Repo).count()
-                user_count = db.session.query(Chat).count()
-                subscription_count = db.session.query(ChatRepo).count()
+                counts = Counter.get_counts(db.session)
 
-                text = (f"I have to update {release_count} releases for {repo_count} repos via {subscription_count} "
-                        f"subscriptions added by {user_count} users.")
+                text = (f"I have to update {counts['release']} releases for {counts['repo']} repos via "
+                        f"{counts['chat_repo']} subscriptions added by {counts['chat']} users.")
 
             await update.message.reply_text(text)
 
-    def _pypi2github(self, project_name):
-        resp = urllib3.request("GET", f"https://pypi.org/pypi/{project_name}/json")
-        repo_name = None
-        if resp.status == 200:
-            pypi_data = json.loads(resp.data.decode('utf-8'))
-            if pypi_data["info"]["project_urls"]:
-                if ("Source" in pypi_data["info"]["project_urls"] and
-                        github_link_pattern.search(pypi_data["info"]["project_urls"]["Source"])):
-                    link_groups = github_link_pattern.search(pypi_data["info"]["project_urls"]["Source"])
-                    repo_name = link_groups.group(1)
-                elif ("Source Code" in pypi_data["info"]["project_urls"] and
-                      github_link_pattern.search(pypi_data["info"]["project_urls"]["Source Code"])):
-                    link_groups = github_link_pattern.search(pypi_data["info"]["project_urls"]["Source Code"])
-                    repo_name = link_groups.group(1)
-                elif ("Homepage" in pypi_data["info"]["project_urls"] and
-                      github_link_pattern.search(pypi_data["info"]["project_urls"]["Homepage"])):
-                    link_groups = github_link_pattern.search(pypi_data["info"]["project_urls"]["Homepage"])
-                    repo_name = link_groups.group(1)
-            elif pypi_data["info"]["home_page"] and github_link_pattern.search(pypi_data["info"]["home_page"]):
-                link_groups = github_link_pattern.search(pypi_data["info"]["home_page"])
-                repo_name = link_groups.group(1)
-
-        return resp.status, repo_name
-
-    def _npm2github(self, package_name):
-        package_name_quoted = urllib.parse.quote(package_name, safe='')
-        resp = urllib3.request("GET", f"https://api.npms.io/v2/package/{package_name_quoted}")
-        repo_name = None
-        if resp.status == 200:
-            npm_data = json.loads(resp.data.decode('utf-8'))
-            if ("repository" in npm_data["collected"]["metadata"]["links"] and
-                    github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["repository"])):
-                link_groups = github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["repository"])
-                repo_name = link_groups.group(1)
-            elif ("homepage" in npm_data["collected"]["metadata"]["links"] and
-                  github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["homepage"])):
-                link_groups = github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["homepage"])
-                repo_name = link_groups.group(1)
-            elif ("homepage" in npm_data["collected"]["metadata"]["links"] and
-                  github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["repository"])):
-                link_groups = github_link_pattern.search(npm_data["collected"]["metadata"]["links"]["repository"])
-                repo_name = link_groups.group(1)
-
-        return resp.status, repo_name
-
     async def message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Add GitHub repo"""
         if chat_id := self._get_chat_id(update):
@@ -567,10 +569,12 @@ class TelegramBot(object):
                 if not text.startswith(f"@{bot_name}"):
                     return
 
+            package = None
             if pypi_link_pattern.search(update.message.text):
                 link_groups = pypi_link_pattern.search(update.message.text)
                 project = link_groups.group(1)
-                status, repo_name = self._pypi2github(project)
+                package = ("pypi", normalize_package_name("pypi", project))
+                status, repo_name = (await resolve_packages("pypi", [project]))[project]
                 if status == 200:
                     if not repo_name:
                         await update.message.reply_text(f"Project {project} has not link to GitHub repository.")
@@ -581,7 +585,8 @@ class TelegramBot(object):
             elif npm_link_pattern.search(update.message.text):
                 link_groups = npm_link_pattern.search(update.message.text)
                 package_name = link_groups.group(1)
-                status, repo_name = self._npm2github(package_name)
+                package = ("npm", package_name)
+                status, repo_name = (await resolve_packages("npm", [package_name]))[package_name]
                 if status == 200:
                     if not repo_name:
                         await update.message.reply_text(f"Project {package_name} has not link to GitHub repository.")
@@ -599,12 +604,12 @@ class TelegramBot(object):
                 return
 
             try:
-                repo = github_obj.get_repo(repo_name)
+                repo = await asyncio.to_thread(github_obj.get_repo, repo_name)
             except github.GithubException as e:
                 await update.message.reply_text("Sorry, I can't find that repo.")
                 return
 
-            await self.add_repo(chat_id, repo, update.get_bot(), False)
+            await self.add_repo(chat_id, repo, update.get_bot(), False, package)
 
     async def download_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Add GitHub repo from uploaded requirements.txt"""
@@ -616,36 +621,81 @@ class TelegramBot(object):
                 file = await context.bot.get_file(update.message.document)
                 data = await file.download_as_bytearray()
                 decoded_string = data.decode("utf-8", errors='replace')
-                for req in requirements.parse(decoded_string):
-                    status, repo_name = self._pypi2github(req.name)
-                    if status == 200 and repo_name:
-                        try:
-                            repo = github_obj.get_repo(repo_name)
-                        except github.GithubException as e:
-                            print("Github Exception in download_file", e)
-                            continue
-
-                        await self.add_repo(chat_id, repo, update.get_bot(), True)
+                ecosystem = "pypi"
+                # URL and VCS lines have no package name
+                packages = [req.name for req in requirements.parse(decoded_string) if req.name]
             elif update.message.document.file_name == "package.json":
                 file = await context.bot.get_file(update.message.document)
                 data = await file.download_as_bytearray()
                 decoded_string = data.decode("utf-8", errors='replace')
                 json_data = json.loads(decoded_string)
-                if "dependencies" in json_data:
-                    for package in json_data["dependencies"].keys():
-                        status, repo_name = self._npm2github(package)
-                        if status == 200 and repo_name:
-                            try:
-                                repo = github_obj.get_repo(repo_name)
-                            except github.GithubException as e:
-                                print("Github Exception in download_file", e)
-                                continue
-
-                            await self.add_repo(chat_id, repo, update.get_bot(), True)
+                ecosystem = "npm"
+                packages = list(json_data.get("dependencies", {}).keys())
             else:
                 await update.message.reply_text("I don't know this file format.")
                 return
 
+            added, skipped, failed = await self.add_packages(chat_id, ecosystem, packages)
+
+            text = f"Added {len(added)} repos"
+            if added:
+                text += f": {", ".join(added)}"
+            if skipped:
+                text += f"\nSkipped {len(skipped)} packages: {", ".join(skipped)}"
+            if failed:
+                text += f"\nFailed {len(failed)} packages: {", ".join(failed)}"
+            await update.message.reply_text(text[:MessageLimit.MAX_TEXT_LENGTH])
+
+    async def add_packages(self, chat_id, ecosystem, packages):
+        """Resolve packages to GitHub repos in parallel and subscribe to them in bulk.
+
+        Returns lists of added repos, skipped and failed packages."""
+        resolved = await resolve_packages(ecosystem, packages)
+        skipped = [package for package, (status, repo_name) in resolved.items()
+                   if status == HTTPStatus.OK and not repo_name]
+        failed = [package for package, (status, repo_name) in resolved.items() if status != HTTPStatus.OK]
+        packages_by_repo_name = {}
+        for package, (status, repo_name) in resolved.items():
+            if status == HTTPStatus.OK and repo_name:
+                packages_by_repo_name.setdefault(repo_name.lower(), []).append(package)
+
+        semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+
+        async def get_repo_data(repo_name):
+            async with semaphore:
+                # PyGithub is blocking, keep the bot event loop free
+                repo = await asyncio.to_thread(github_obj.get_repo, repo_name)
+                return repo.raw_data
+
+        repo_names = list(packages_by_repo_name)
+        results = await asyncio.gather(*(get_repo_data(repo_name) for repo_name in repo_names),
+                                       return_exceptions=True)
+        repos_data = []
+        packages_by_repo_id = {}
+        for repo_name, result in zip(repo_names, results):
+            if isinstance(result, github.GithubException):
+                failed += packages_by_repo_name[repo_name]
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                # Renamed repos are redirected, so key by id rather than by the resolved name
+                repos_data.append(result)
+                packages_by_repo_id.setdefault(result['id'], []).extend(packages_by_repo_name[repo_name])
+
+        with self.app.app_context():
+            chat = get_or_create_chat(db.session, chat_id)
+            # Seeding releases of new repos calls GitHub API
+            added = await asyncio.to_thread(subscribe_repos, db.session, chat, repos_data,
+                                            self.app.config['MAX_REPOS_PER_CHAT'])
+            link_repo_packages(db.session, ecosystem, {repo_id: normalize_package_name(ecosystem, packages[0])
+                                                       for repo_id, packages in packages_by_repo_id.items()})
+            db.session.commit()
+
+        added_ids = {repo_data['id'] for repo_data in added}
+        skipped += [package for repo_id, packages in packages_by_repo_id.items() if repo_id not in added_ids
+                    for package in packages]
+        return [repo_data['full_name'] for repo_data in added], skipped, failed
+
     async def unknown_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if self._get_chat_id(update):
             if self._is_group(update):
@@ -657,13 +707,21 @@ class TelegramBot(object):
             await update.message.reply_text("Sorry, I don't understand. Please pick one of the valid options.")
             await self.start_command(update, context)
 
-    async def get_me(self, *args, **kwargs):
+    async def _call_bot(self, method, *args, **kwargs):
+        if self.loop:
+            # Bot HTTP client belongs to the update loop, run there instead of setting up a client per call
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self.loop))
         async with self.application.bot:
-            return await self.application.bot.getMe(*args, **kwargs)
+            return await method(*args, **kwargs)
+
+    async def get_me(self):
+        # Bot identity doesn't change while running, fetch it once
+        if not self.me:
+            self.me = await self._call_bot(self.application.bot.get_me)
+        return self.me
 
     async def send_message(self, *args, **kwargs):
-        async with self.application.bot:
-            await self.application.bot.send_message(*args, **kwargs)
+        await self._call_bot(self.application.bot.send_message, *args, **kwargs)
 
     async def test_token(self):
         try:
@@ -672,12 +730,24 @@ class TelegramBot(object):
         except telegram.error.InvalidToken:
             return False
 
-    async def webhook(self, data):
-        async with self.application.bot:
-            await self.application.process_update(Update.de_json(data=data, bot=self.application.bot))
+    def webhook(self, data):
+        """Queue update for the long-lived application, it is processed concurrently with others"""
+        update = Update.de_json(data=data, bot=self.application.bot)
+        asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), self.loop).result()
 
-    async def run_webhook(self):
+    async def _start_application(self):
         await self.application.initialize()
+        await self.application.start()
+
+    def start_update_loop(self):
+        """Run the application with an initialized bot HTTP client on one event loop for process lifetime"""
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, name='telegram-updates')
+        thread.daemon = True
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_application(), self.loop).result()
+
+    async def run_webhook(self):
         async with self.application.bot:
             await self.set_commands(self.application)
             await self.application.bot.set_webhook(url=f"{self.app.config['SITE_URL']}/telegram",
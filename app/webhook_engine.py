@@ -0,0 +1,62 @@
+import hashlib
+import hmac
+from datetime import datetime
+from email.utils import format_datetime
+
+from github.GitRelease import GitRelease
+from github.Tag import Tag
+
+from app import app, github_obj
+from app.models import aware_utcnow
+from app.poll_engine import RepoSnapshot
+
+RELEASE_ACTIONS = ("published", "released", "prereleased", "edited")
+
+
+def verify_signature(secret, body, signature):
+    """Check X-Hub-Signature-256 header against HMAC SHA-256 of the raw request body, never valid without secret"""
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(digest, signature.removeprefix("sha256="))
+
+
+def parse_release(data):
+    # Webhook release has the REST API shape, its last modification time comes from the Last-Modified header there
+    updated_at = data.get('updated_at') or data['published_at'] or data['created_at']
+    headers = {'last-modified': format_datetime(datetime.fromisoformat(updated_at), usegmt=True)}
+    return github_obj.create_from_raw_data(GitRelease, data, headers)
+
+
+def parse_event(event, payload, repo_obj):
+    """Convert release or tag create event to a RepoSnapshot for store_and_enqueue, None when it isn't news"""
+    snapshot = RepoSnapshot(repo_obj.id)
+
+    if event == "release" and payload['action'] in RELEASE_ACTIONS:
+        release = parse_release(payload['release'])
+        if release.draft:
+            return None
+        if payload['action'] == "edited":
+            # Only the latest release is tracked, edits of older ones aren't news
+            latest_release_obj = repo_obj.latest_stable_release
+            if not latest_release_obj or latest_release_obj.release_id != release.id:
+                return None
+
+        if release.prerelease:
+            if not app.config['PROCESS_PRE_RELEASES']:
+                return None
+            # Unlike polling, pre-release isn't held back for 15 minutes, this event won't come again
+            snapshot.prerelease = release
+        else:
+            snapshot.release = release
+    elif event == "create" and payload['ref_type'] == "tag":
+        if repo_obj.latest_stable_release and repo_obj.latest_stable_release.release_id:
+            # Repo has releases, its tags are not tracked
+            return None
+        snapshot.tag = github_obj.create_from_raw_data(Tag, {'name': payload['ref']}, {
+            'last-modified': format_datetime(aware_utcnow(), usegmt=True),
+        })
+    else:
+        return None
+
+    return snapshot
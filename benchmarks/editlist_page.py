@@ -0,0 +1,137 @@
+"""Compare /editlist keyboard page queries against the old per-repo ones on a chat with many subscriptions.
+
+Fills an empty scratch database with one chat subscribed to generated repos with releases, then builds the rows of
+first, middle and last keyboard pages the old way (whole chat.repos and latest release and ChatRepo queries per
+repo) and with get_chat_repos_page, counting SQL statements. Run from the repository root, e.g.:
+
+    PYTHONPATH=. python benchmarks/editlist_page.py --subscriptions 2000
+    PYTHONPATH=. python benchmarks/editlist_page.py --database-uri postgresql://localhost/editlist_page
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+# No roles, nothing connects to Telegram or polls GitHub
+os.environ.setdefault('ROLES', '')
+
+from sqlalchemy import create_engine, event, inspect, true  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from telegram.constants import InlineKeyboardMarkupLimit  # noqa: E402
+
+from app import db  # noqa: E402
+from app.models import Chat, ChatRepo, Release, Repo  # noqa: E402
+from app.telegram_bot import get_chat_repos_page  # noqa: E402
+
+CHAT_ID = 1
+# Rows per page of TelegramBot.get_repo_keyboard
+PAGE_LINES = (InlineKeyboardMarkupLimit.TOTAL_BUTTON_NUMBER - 3) // 4
+
+
+def fill(engine, subscriptions, releases_per_repo):
+    release_date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(Chat.__table__.insert(), [dict(id=CHAT_ID)])
+        repos = []
+        releases = []
+        for repo_id in range(1, subscriptions + 1):
+            release_ids = range((repo_id - 1) * releases_per_repo + 1, repo_id * releases_per_repo + 1)
+            # Every third release is a pre-release, the newest one too
+            stable_ids = [release_id for release_id in release_ids if release_id % 3]
+            repos.append(dict(id=repo_id, full_name=f"owner/repo-{repo_id:05}", link=f"https://github.com/{repo_id}",
+                              latest_release_id=release_ids[-1] if release_ids else None,
+                              latest_stable_release_id=stable_ids[-1] if stable_ids else None))
+            releases += [dict(id=release_id, release_id=release_id, tag_name=f"v{release_id}",
+                              release_date=release_date, pre_release=not release_id % 3, repo_id=repo_id)
+                         for release_id in release_ids]
+        connection.execute(Repo.__table__.insert(), repos)
+        if releases:
+            connection.execute(Release.__table__.insert(), releases)
+        connection.execute(ChatRepo.__table__.insert(),
+                           [dict(chat_id=CHAT_ID, repo_id=repo_id, process_pre_releases=bool(repo_id % 2))
+                            for repo_id in range(1, subscriptions + 1)])
+
+
+def old_page(session, chat, page):
+    """Keyboard rows of TelegramBot.get_repo_keyboard before get_chat_repos_page"""
+    rows = []
+    for repo in chat.repos[page * PAGE_LINES:(page + 1) * PAGE_LINES]:
+        latest_release = None
+        if repo.releases:
+            chat_repo = session.query(ChatRepo) \
+                .filter(ChatRepo.chat_id == chat.id).filter(ChatRepo.repo_id == repo.id) \
+                .first()
+            if chat_repo.process_pre_releases:
+                latest_release = repo.releases[-1]
+            else:
+                latest_release = session.query(Release) \
+                    .filter(Release.repo_id == repo.id) \
+                    .filter(Release.pre_release != true()) \
+                    .order_by(Release.id.desc()) \
+                    .first()
+        chat_repo = session.query(ChatRepo) \
+            .filter(ChatRepo.chat_id == chat.id).filter(ChatRepo.repo_id == repo.id) \
+            .first()
+        rows.append((repo, chat_repo.process_pre_releases, latest_release))
+    return rows
+
+
+def new_page(session, chat, page):
+    return get_chat_repos_page(session, chat, page * PAGE_LINES, PAGE_LINES + 1)[:PAGE_LINES]
+
+
+def measure(engine, build_page, page, repeat):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    elapsed = 0
+    try:
+        for _ in range(repeat):
+            # New session per keyboard, like a request to the bot
+            with Session(engine) as session:
+                started_at = time.perf_counter()
+                chat = session.get(Chat, CHAT_ID)
+                rows = build_page(session, chat, page)
+                elapsed += time.perf_counter() - started_at
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    return elapsed / repeat, len(statements) // repeat, [(repo.id, process_pre_releases)
+                                                         for repo, process_pre_releases, _ in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', default='sqlite://', help="empty scratch database, its tables are dropped")
+    parser.add_argument('--subscriptions', type=int, default=2000, help="repos the chat is subscribed to")
+    parser.add_argument('--releases', type=int, default=20, help="releases per repo")
+    parser.add_argument('--repeat', type=int, default=10, help="build every page that many times")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_uri)
+    tables = [Chat.__table__, Repo.__table__, Release.__table__, ChatRepo.__table__]
+    if inspect(engine).get_table_names():
+        parser.error("database is not empty, give a scratch one")
+
+    db.metadata.create_all(engine, tables=tables)
+    try:
+        fill(engine, args.subscriptions, args.releases)
+        last_page = (args.subscriptions - 1) // PAGE_LINES
+        print(f"chat with {args.subscriptions} subscriptions, {args.releases} releases each, "
+              f"{last_page + 1} pages of {PAGE_LINES} rows")
+        for page in sorted({0, last_page // 2, last_page}):
+            old_elapsed, old_statements, old_rows = measure(engine, old_page, page, args.repeat)
+            new_elapsed, new_statements, new_rows = measure(engine, new_page, page, args.repeat)
+            # Old keyboard listed chat.repos in insertion order, which is full name order here. Its latest releases
+            # aren't compared, unordered repo.releases[-1] is whatever the plan returns last
+            assert old_rows == new_rows
+            print(f"page {page}: old {old_elapsed * 1000:.1f}ms in {old_statements} statements, "
+                  f"new {new_elapsed * 1000:.1f}ms in {new_statements} statements")
+    finally:
+        db.metadata.drop_all(engine, tables=tables)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Show query plans and timings of the hot release and chat_repo lookups without and with their indexes.
+
+Fills an empty scratch database with generated repos, releases and subscriptions, then runs the release diff lookup
+of store_release_batch (and its row-value IN form, which SQLite can't search an index for), the latest stable release
+query and the Repo.chats fan-out, first with the indexes dropped and then with them created. Works on SQLite and
+PostgreSQL, run from the repository root, e.g.:
+
+    PYTHONPATH=. python benchmarks/release_indexes.py --database-uri sqlite:////tmp/release_indexes.db
+    PYTHONPATH=. python benchmarks/release_indexes.py --database-uri postgresql://localhost/release_indexes
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+# No roles, nothing connects to Telegram or polls GitHub
+os.environ.setdefault('ROLES', '')
+
+from sqlalchemy import and_, create_engine, func, inspect, or_, select, text, true, tuple_  # noqa: E402
+
+from app import db  # noqa: E402
+from app.models import Chat, ChatRepo, Release, Repo  # noqa: E402
+
+INSERT_BATCH_SIZE = 10000
+INDEXES = [index for table in (Release.__table__, ChatRepo.__table__) for index in table.indexes]
+
+
+def fill(engine, releases, repos, chats, subscriptions):
+    release_date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(Chat.__table__.insert(), [dict(id=chat_id) for chat_id in range(1, chats + 1)])
+        connection.execute(Repo.__table__.insert(),
+                           [dict(id=repo_id, full_name=f"owner/repo-{repo_id}") for repo_id in range(1, repos + 1)])
+        for start in range(0, releases, INSERT_BATCH_SIZE):
+            # Releases of every repo are interleaved, like polls store them
+            connection.execute(Release.__table__.insert(), [
+                dict(id=release_id, release_id=release_id * 7, tag_name=f"v{release_id}", release_date=release_date,
+                     pre_release=release_id % 10 == 0, repo_id=release_id % repos + 1)
+                for release_id in range(start + 1, min(start + INSERT_BATCH_SIZE, releases) + 1)
+            ])
+        rows = set()
+        while len(rows) < subscriptions:
+            rows.add((random.randint(1, chats), random.randint(1, repos)))
+        rows = list(rows)
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            connection.execute(ChatRepo.__table__.insert(),
+                               [dict(chat_id=chat_id, repo_id=repo_id)
+                                for chat_id, repo_id in rows[start:start + INSERT_BATCH_SIZE]])
+
+
+def queries(releases, repos, batch_size):
+    release_ids = random.sample(range(1, releases + 1), batch_size)
+    # Release diff lookup of one store_release_batch, releases and tags of a poll batch
+    release_keys = [(release_id % repos + 1, release_id * 7) for release_id in release_ids[:batch_size // 2]]
+    tag_keys = [(release_id % repos + 1, f"v{release_id}") for release_id in release_ids[batch_size // 2:]]
+    yield "release diff lookup, row-value IN", select(Release).where(or_(
+        tuple_(Release.repo_id, Release.release_id).in_(release_keys),
+        tuple_(Release.repo_id, Release.tag_name).in_(tag_keys),
+    ))
+    yield "release diff lookup, store_release_batch", select(Release).where(or_(
+        *[and_(Release.repo_id == repo_id, Release.release_id == release_id) for repo_id, release_id in release_keys],
+        *[and_(Release.repo_id == repo_id, Release.tag_name == tag_name) for repo_id, tag_name in tag_keys],
+    ))
+
+    repo_id = random.randint(1, repos)
+    yield "latest stable release", select(func.max(Release.id)) \
+        .where(Release.repo_id == repo_id, Release.pre_release != true())
+    yield "Repo.chats fan-out", select(ChatRepo.chat_id).where(ChatRepo.repo_id == repo_id)
+
+
+def explain(connection, statement):
+    sql = str(statement.compile(connection, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        # Skip "INDEX n" headers of OR terms, so their identical plans collapse
+        lines = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+                 if not row[-1].startswith("INDEX ")]
+    else:
+        lines = [row[0] for row in connection.execute(text(f"EXPLAIN {sql}"))]
+    plan = []
+    for line, group in itertools.groupby(lines):
+        count = len(list(group))
+        plan.append(f"{line} (x{count})" if count > 1 else line)
+    return plan
+
+
+def measure(engine, statements, repeat):
+    with engine.connect() as connection:
+        for name, statement in statements:
+            connection.execute(statement).all()  # Warm up the cache
+            started_at = time.perf_counter()
+            for _ in range(repeat):
+                connection.execute(statement).all()
+            elapsed = (time.perf_counter() - started_at) / repeat
+            print(f"  {name}: {elapsed * 1000:.2f}ms")
+            for line in explain(connection, statement):
+                print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', required=True, help="empty scratch database, its tables are dropped after")
+    parser.add_argument('--releases', type=int, default=1000000, help="release rows")
+    parser.add_argument('--repos', type=int, default=20000, help="repos the releases belong to")
+    parser.add_argument('--chats', type=int, default=10000, help="chats subscribed to the repos")
+    parser.add_argument('--subscriptions', type=int, default=100000, help="chat_repo rows")
+    parser.add_argument('--batch-size', type=int, default=50, help="releases and tags in one diff lookup")
+    parser.add_argument('--repeat', type=int, default=20, help="run every query that many times")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_uri)
+    tables = [Chat.__table__, Repo.__table__, Release.__table__, ChatRepo.__table__]
+    if inspect(engine).get_table_names():
+        parser.error("database is not empty, give a scratch one")
+
+    random.seed(0)
+    db.metadata.create_all(engine, tables=tables)
+    try:
+        for index in INDEXES:
+            index.drop(engine)
+        started_at = time.perf_counter()
+        fill(engine, args.releases, args.repos, args.chats, args.subscriptions)
+        print(f"{args.releases} releases of {args.repos} repos, {args.subscriptions} subscriptions "
+              f"filled in {time.perf_counter() - started_at:.1f}s")
+        statements = list(queries(args.releases, args.repos, args.batch_size))
+
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        print("without indexes:")
+        measure(engine, statements, args.repeat)
+
+        for index in INDEXES:
+            index.create(engine)
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        print("with indexes:")
+        measure(engine, statements, args.repeat)
+    finally:
+        db.metadata.drop_all(engine, tables=tables)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Replay recorded Telegram updates through the /telegram webhook endpoint and report throughput and latency.
+
+Updates file has one update JSON per line, as Telegram posts them to the webhook. The endpoint only queues updates,
+so the app runs in-process and the clock stops once every replayed update has been handled by the bot, not when it
+was queued. Bot replies go to the chats of recorded updates, so record them in a test chat. Run from the repository
+root with the app configuration, e.g.:
+
+    SITE_URL=https://example.com TELEGRAM_BOT_TOKEN=... PYTHONPATH=. \\
+        python benchmarks/replay_updates.py updates.jsonl --repeat 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Web role only, the bot role would register the webhook with Telegram
+os.environ.setdefault('ROLES', 'web')
+
+from app import app, telegram_bot  # noqa: E402
+
+
+def replay(updates, concurrency):
+    def post(update):
+        started_at = time.perf_counter()
+        # Test client per request, like a gunicorn thread per request
+        resp = app.test_client().post("/telegram", json=update)
+        return resp.status_code, time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(post, updates))
+    queued_in = time.perf_counter() - started_at
+
+    # Application calls task_done() for every update once its handlers finished
+    asyncio.run_coroutine_threadsafe(telegram_bot.application.update_queue.join(), telegram_bot.loop).result()
+    elapsed = time.perf_counter() - started_at
+
+    latencies = [latency for status, latency in results if status == 200]
+    return latencies, len(results) - len(latencies), queued_in, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('updates', help="file with one recorded update JSON per line")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent webhook requests, gunicorn threads")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the recorded updates that many times")
+    args = parser.parse_args()
+
+    if not app.config['SITE_URL'] or not telegram_bot:
+        parser.error("SITE_URL and TELEGRAM_BOT_TOKEN must be set, updates are only queued in webhook mode")
+
+    with open(args.updates) as f:
+        recorded = [json.loads(line) for line in f if line.strip()]
+    updates = []
+    for i in range(args.repeat):
+        for update in recorded:
+            # Unique update ids, as Telegram would send them
+            updates.append(dict(update, update_id=update['update_id'] + i * len(recorded)))
+
+    latencies, errors, queued_in, elapsed = replay(updates, args.concurrency)
+    print(f"{len(updates)} updates queued in {queued_in:.2f}s and handled in {elapsed:.2f}s, "
+          f"{len(updates) / elapsed:.1f} updates/s, {errors} errors")
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"webhook latency p50 {quantiles[49] * 1000:.1f}ms, p95 {quantiles[94] * 1000:.1f}ms, "
+              f"p99 {quantiles[98] * 1000:.1f}ms, max {max(latencies) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Compare Markdown release message truncation against the old one, which cut 100 chars per markdownify call.
+
+Release notes are fetched from GitHub releases of given repositories, the longest ones are the interesting ones.
+Both messages are checked to fit into Telegram message. Run from the repository root with the app configuration,
+e.g.:
+
+    GITHUB_TOKEN=... PYTHONPATH=. python benchmarks/truncate_markdown.py microsoft/vscode home-assistant/core
+"""
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+# No roles, nothing connects to Telegram or polls GitHub
+os.environ.setdefault('ROLES', '')
+
+from telegram.constants import MessageLimit  # noqa: E402
+from telegramify_markdown import markdownify  # noqa: E402
+
+from app import github_obj  # noqa: E402
+from app.repo_engine import (format_release_message, github_extra_html_tags_pattern,  # noqa: E402
+                             github_img_html_tag_pattern)
+
+MARKDOWN_CHAT = SimpleNamespace(release_note_format="markdown")
+
+
+def old_format_release_message(repo, release):
+    """Markdown branch of format_release_message before truncate_markdown"""
+    release_body = github_extra_html_tags_pattern.sub("", release.body)
+    release_body = github_img_html_tag_pattern.sub("\\1", release_body)
+    if len(release_body) > MessageLimit.MAX_TEXT_LENGTH - 256:
+        release_body = f"{release_body[:MessageLimit.MAX_TEXT_LENGTH - 256]}\n-=SKIPPED=-"
+    if release.title in (release.tag_name, f"v{release.tag_name}") or f"v{release.title}" == release.tag_name:
+        release_title = ""
+    else:
+        release_title = release.title
+    header = (f"*{repo.full_name}*\n"
+              f"{f"`{release_title}`" if release_title else ""}"
+              f" [{release.tag_name}]({release.html_url})"
+              f"{" _pre-release_" if release.prerelease else ""}\n\n")
+    message = markdownify(f"{header}{release_body}")
+    while len(message) >= MessageLimit.MAX_TEXT_LENGTH:
+        release_body = release_body[:len(release_body)-100] + "\n-=SKIPPED=-"
+        message = markdownify(f"{header}{release_body}")
+    return message
+
+
+def fetch_releases(full_names, per_repo):
+    releases = []
+    for full_name in full_names:
+        repo_obj = github_obj.get_repo(full_name)
+        for release_obj in repo_obj.get_releases()[:per_repo]:
+            releases.append((
+                SimpleNamespace(full_name=repo_obj.full_name),
+                SimpleNamespace(tag_name=release_obj.tag_name, title=release_obj.title or release_obj.tag_name,
+                                html_url=release_obj.html_url, body=release_obj.body or "",
+                                prerelease=release_obj.prerelease, updated=False)
+            ))
+    return releases
+
+
+def measure(format_message, releases, repeat):
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        messages = [format_message(repo, release) for repo, release in releases]
+    elapsed = time.perf_counter() - started_at
+    assert all(len(message) < MessageLimit.MAX_TEXT_LENGTH for message in messages)
+    return elapsed / repeat, messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('repos', nargs='+', help="full names of GitHub repositories to take release notes from")
+    parser.add_argument('--releases', type=int, default=30, help="latest releases taken per repository")
+    parser.add_argument('--repeat', type=int, default=3, help="format every release note that many times")
+    args = parser.parse_args()
+
+    releases = fetch_releases(args.repos, args.releases)
+    # Only notes cut to a message length are truncated
+    releases = [(repo, release) for repo, release in releases if len(release.body) > MessageLimit.MAX_TEXT_LENGTH - 256]
+    if not releases:
+        parser.error("no release notes long enough to be truncated, try more repositories or releases")
+
+    old_elapsed, old_messages = measure(old_format_release_message, releases, args.repeat)
+    new_elapsed, new_messages = measure(lambda repo, release: format_release_message(MARKDOWN_CHAT, repo, release),
+                                        releases, args.repeat)
+    print(f"{len(releases)} long release notes, "
+          f"old {old_elapsed * 1000:.1f}ms, new {new_elapsed * 1000:.1f}ms, {old_elapsed / new_elapsed:.1f}x faster")
+    kept = sum(len(new) - len(old) for old, new in zip(old_messages, new_messages)) / len(releases)
+    print(f"new messages are {kept:+.0f} chars longer on average")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -7,12 +8,28 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config:
     TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
     GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+    GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+    GITHUB_URL = os.environ.get('GITHUB_URL', 'https://github.com')
+    GITHUB_WEBHOOK_SECRET = os.environ.get('GITHUB_WEBHOOK_SECRET')
     SITE_URL = os.environ.get('SITE_URL')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI', f'sqlite:///{basedir}/data/db.sqlite')
     SQLALCHEMY_ECHO = os.environ.get('SQL_DEBUG', '').lower() in ('true', '1', 't')
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
     MAX_REPOS_PER_CHAT = int(os.environ.get('MAX_REPOS_PER_CHAT', 0))
+    RELEASE_RETENTION = int(os.environ.get('RELEASE_RETENTION', 20))
     PROCESS_PRE_RELEASES = bool(GITHUB_TOKEN)
+    POLL_CONCURRENCY = int(os.environ.get('POLL_CONCURRENCY', 16))
+    NOTIFY_CONCURRENCY = int(os.environ.get('NOTIFY_CONCURRENCY', 16))
+    POLL_MIN_INTERVAL = int(os.environ.get('POLL_MIN_INTERVAL', 15))  # minutes
+    POLL_MAX_INTERVAL = int(os.environ.get('POLL_MAX_INTERVAL', 360))  # minutes
+    POLL_GRAPHQL = bool(GITHUB_TOKEN)  # GitHub GraphQL API requires authentication
+    POLL_ATOM = not GITHUB_TOKEN  # Atom feeds aren't under the REST API rate limit
+    POLL_SHARDS = int(os.environ.get('POLL_SHARDS', 1))
+    WORKER_ID = os.environ.get('WORKER_ID', f'{socket.gethostname()}:{os.getpid()}')
+    # Comma separated list of web, bot and poller, or all. Empty for CLI and migration tooling
+    ROLES = {role.strip() for role in os.environ.get('ROLES', 'all').split(',') if role.strip()}
+    if 'all' in ROLES:
+        ROLES = {'web', 'bot', 'poller'}
     CHAT_ID = []
     if 'CHAT_ID' in os.environ:
         for chat_id in os.environ.get('CHAT_ID').split(','):
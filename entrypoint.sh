@@ -1,11 +1,11 @@
 #!/usr/bin/bash
 
 while true; do
-    flask db upgrade
+    ROLES= flask db upgrade
     if [[ "$?" == "0" ]]; then
         break
     fi
     echo Deploy command failed, retrying in 5 secs...
     sleep 5
 done
-gunicorn -b :5000 app:app
+gunicorn -b :5000 --threads 8 app:app
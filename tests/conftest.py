@@ -0,0 +1,34 @@
+import os
+
+import flask_migrate
+import pytest
+from sqlalchemy import text
+
+# Config is read when app is imported: no roles, so nothing connects to Telegram or GitHub
+os.environ['ROLES'] = ''
+os.environ['DATABASE_URI'] = 'sqlite://'
+os.environ.pop('TELEGRAM_BOT_TOKEN', None)
+
+from app import app, db  # noqa: E402
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+@pytest.fixture
+def database():
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.drop_all()
+
+
+@pytest.fixture
+def migrated_database():
+    """Schema built by the migrations, with the database triggers create_all doesn't know about"""
+    with app.app_context():
+        flask_migrate.upgrade(directory=MIGRATIONS_DIRECTORY)
+        yield db
+        db.session.rollback()
+        db.drop_all()
+        db.session.execute(text("DROP TABLE alembic_version"))
+        db.session.commit()
@@ -0,0 +1,148 @@
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import app, graphql_engine
+from app.graphql_engine import build_batch_query, fetch_repos_batch, parse_repo_node
+
+OLD = "2026-01-01T00:00:00Z"
+
+
+def release_node(database_id, prerelease=False, draft=False, published_at=OLD):
+    return {
+        'databaseId': database_id,
+        'name': f"Release {database_id}",
+        'tagName': f"v{database_id}",
+        'url': f"https://github.com/owner/repo/releases/tag/v{database_id}",
+        'description': None,
+        'isDraft': draft,
+        'isPrerelease': prerelease,
+        'publishedAt': published_at,
+        'updatedAt': published_at,
+    }
+
+
+def repo_node(latest_release=None, newest_release=None, tag=None, archived=False):
+    return {
+        'databaseId': 1,
+        'isArchived': archived,
+        'latestRelease': latest_release,
+        'releases': {'nodes': [newest_release] if newest_release else []},
+        'refs': {'nodes': [tag] if tag else []},
+    }
+
+
+@pytest.fixture(autouse=True)
+def process_pre_releases(monkeypatch):
+    monkeypatch.setitem(app.config, 'PROCESS_PRE_RELEASES', True)
+
+
+def test_build_batch_query():
+    query = build_batch_query(["MDEwOlJlcG9zaXRvcnkx", 'id "quoted"'])
+
+    assert '  r0: node(id: "MDEwOlJlcG9zaXRvcnkx") { ...RepoFields }' in query
+    assert '  r1: node(id: "id \\"quoted\\"") { ...RepoFields }' in query
+    assert "  rateLimit { cost }" in query
+    assert "fragment RepoFields on Repository" in query
+    assert "fragment ReleaseFields on Release" in query
+
+
+def test_fetch_repos_batch_maps_aliases_to_node_ids(monkeypatch):
+    node = repo_node()
+    requests = []
+
+    def request_json_and_check(verb, url, input):
+        requests.append(input['query'])
+        # Deleted repos come back as null nodes, with an error for each of them
+        return {}, {'data': {'r0': node, 'r1': None}, 'errors': [{'type': "NOT_FOUND", 'path': ["r1"]}]}
+
+    requester = SimpleNamespace(graphql_url="https://api.github.com/graphql",
+                                requestJsonAndCheck=request_json_and_check)
+    monkeypatch.setattr(graphql_engine, "github_obj", SimpleNamespace(requester=requester))
+
+    assert fetch_repos_batch(["a", "b", "c"]) == {"a": node, "b": None, "c": None}
+    assert len(requests) == 1
+
+
+def test_fetch_repos_batch_reads_cost_of_full_batches(monkeypatch):
+    def request_json_and_check(verb, url, input):
+        return {}, {'data': {'rateLimit': {'cost': 3}}}
+
+    requester = SimpleNamespace(graphql_url="https://api.github.com/graphql",
+                                requestJsonAndCheck=request_json_and_check)
+    monkeypatch.setattr(graphql_engine, "github_obj", SimpleNamespace(requester=requester))
+    monkeypatch.setattr(graphql_engine, "batch_cost", 2)
+
+    # Cost of a partial batch says little about a full one
+    fetch_repos_batch(["a"])
+    assert graphql_engine.batch_cost == 2
+
+    fetch_repos_batch([f"n{i}" for i in range(graphql_engine.GRAPHQL_BATCH_SIZE)])
+    assert graphql_engine.batch_cost == 3
+
+
+def test_fetch_repos_batch_without_data(monkeypatch):
+    requester = SimpleNamespace(graphql_url="https://api.github.com/graphql",
+                                requestJsonAndCheck=lambda verb, url, input: ({}, {'data': None}))
+    monkeypatch.setattr(graphql_engine, "github_obj", SimpleNamespace(requester=requester))
+
+    assert fetch_repos_batch(["a"]) == {"a": None}
+
+
+def test_parse_repo_node_latest_release():
+    archived, release, prerelease, tag = parse_repo_node(repo_node(
+        latest_release=release_node(1), newest_release=release_node(1), tag={'name': "v1", 'target': None},
+        archived=True,
+    ))
+
+    assert archived is True
+    assert (release.id, release.tag_name, release.body) == (1, "v1", "")
+    assert release.last_modified_datetime == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Newest release isn't a pre-release, tags aren't tracked when there are releases
+    assert prerelease is None
+    assert tag is None
+
+
+def test_parse_repo_node_skips_draft_latest_release():
+    assert parse_repo_node(repo_node(latest_release=release_node(1, draft=True)))[1] is None
+
+
+def test_parse_repo_node_prerelease():
+    _, release, prerelease, _ = parse_repo_node(repo_node(
+        latest_release=release_node(1), newest_release=release_node(2, prerelease=True),
+    ))
+
+    assert release.id == 1
+    assert prerelease.id == 2
+
+
+def test_parse_repo_node_holds_back_fresh_prerelease():
+    published_at = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    node = repo_node(latest_release=release_node(1), newest_release=release_node(2, True, published_at=published_at))
+
+    assert parse_repo_node(node)[2] is None
+
+
+def test_parse_repo_node_ignores_prerelease_when_disabled(monkeypatch):
+    monkeypatch.setitem(app.config, 'PROCESS_PRE_RELEASES', False)
+
+    assert parse_repo_node(repo_node(newest_release=release_node(2, prerelease=True)))[2] is None
+
+
+@pytest.mark.parametrize("target,last_modified", [
+    ({'committedDate': OLD}, datetime(2026, 1, 1, tzinfo=timezone.utc)),  # Lightweight tag
+    ({'tagger': {'date': "2026-02-01T00:00:00Z"}}, datetime(2026, 2, 1, tzinfo=timezone.utc)),  # Annotated tag
+    ({}, None),  # Tag of a tree or blob
+    (None, None),
+])
+def test_parse_repo_node_tag_without_releases(target, last_modified):
+    _, release, prerelease, tag = parse_repo_node(repo_node(tag={'name': "v1.0", 'target': target}))
+
+    assert release is None
+    assert prerelease is None
+    assert (tag.name, tag.last_modified_datetime) == ("v1.0", last_modified)
+
+
+def test_parse_repo_node_without_releases_and_tags():
+    assert parse_repo_node(repo_node()) == (False, None, None, None)
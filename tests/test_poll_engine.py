@@ -0,0 +1,58 @@
+import httpx
+
+from app import poll_engine
+from app.models import FeedCursor, Repo
+from app.repo_engine import ReleaseSource
+
+
+class FakeSource(ReleaseSource):
+    ecosystem = "pypi"
+
+    def __init__(self, updated_packages, error=None):
+        self.updated_packages = updated_packages
+        self.error = error
+        self.cursors = []
+
+    def fetch_updated_packages(self, cursor):
+        self.cursors.append(cursor)
+        if self.error:
+            raise self.error
+        return self.updated_packages, str(int(cursor or 0) + 1)
+
+
+def add_package_repos(session):
+    session.add_all([
+        Repo(id=1, full_name="pallets/flask", link="https://github.com/pallets/flask",
+             package_ecosystem="pypi", package_name="flask"),
+        Repo(id=2, full_name="pallets/jinja", link="https://github.com/pallets/jinja",
+             package_ecosystem="pypi", package_name="jinja2"),
+    ])
+    session.commit()
+
+
+def test_mark_updated_packages_due_persists_cursor(database, monkeypatch):
+    add_package_repos(database.session)
+    # Restarted process starts with a new source, the cursor comes from the database
+    source = FakeSource(None)
+    monkeypatch.setattr(poll_engine, "release_sources", [source])
+    assert poll_engine.mark_updated_packages_due(database.session) == 0
+
+    source = FakeSource({"flask", "django"})
+    monkeypatch.setattr(poll_engine, "release_sources", [source])
+    assert poll_engine.mark_updated_packages_due(database.session) == 1
+
+    assert source.cursors == ["1"]
+    assert database.session.get(FeedCursor, "pypi").cursor == "2"
+    assert database.session.get(Repo, 1).next_poll_at is not None
+    assert database.session.get(Repo, 2).next_poll_at is None
+
+
+def test_mark_updated_packages_due_keeps_cursor_on_error(database, monkeypatch):
+    add_package_repos(database.session)
+    database.session.add(FeedCursor(ecosystem="pypi", cursor="5"))
+    database.session.commit()
+
+    monkeypatch.setattr(poll_engine, "release_sources", [FakeSource(None, httpx.ConnectError("down"))])
+    assert poll_engine.mark_updated_packages_due(database.session) == 0
+
+    assert database.session.get(FeedCursor, "pypi").cursor == "5"
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import requirements
+
+from app import resolver
+from app.models import PackageMapping
+
+REQUIREMENTS = """flask==3.1.0
+git+https://github.com/JanisV/release-bot.git
+https://example.com/packages/example-1.0.tar.gz
+"""
+
+
+def test_resolve_packages_skips_url_requirements(database, monkeypatch):
+    fetched = []
+
+    async def fetch_packages(ecosystem, names):
+        fetched.extend(names)
+        return {name: (HTTPStatus.OK, "pallets/flask") for name in names}
+
+    monkeypatch.setattr(resolver, "fetch_packages", fetch_packages)
+    monkeypatch.setattr(resolver, "mapping_lru", resolver.OrderedDict())
+
+    # URL lines have no package name
+    names = [req.name for req in requirements.parse(REQUIREMENTS)]
+    resolved = asyncio.run(resolver.resolve_packages("pypi", names))
+
+    assert fetched == ["flask"]
+    assert resolved == {"flask": (HTTPStatus.OK, "pallets/flask")}
+
+
+def test_store_mappings_updates_existing_rows(database):
+    resolved_at = datetime(2026, 1, 1)
+    resolver.store_mappings(database.session, "pypi", {"flask": (None, resolved_at)})
+    database.session.commit()
+    # Resolved again concurrently, the row exists already
+    resolver.store_mappings(database.session, "pypi", {"flask": ("pallets/flask", resolved_at + timedelta(days=1)),
+                                                       "jinja2": ("pallets/jinja", resolved_at)})
+    database.session.commit()
+
+    rows = database.session.query(PackageMapping.package, PackageMapping.repo_name, PackageMapping.resolved_at) \
+        .order_by(PackageMapping.package).all()
+    assert rows == [("flask", "pallets/flask", resolved_at + timedelta(days=1)),
+                    ("jinja2", "pallets/jinja", resolved_at)]
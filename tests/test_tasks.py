@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func
+
+from app import tasks
+from app.models import Chat, ChatRepo, Counter, Release, Repo
+
+
+def add_rows(session):
+    session.add_all([Chat(id=1), Chat(id=2)])
+    session.add_all([Repo(id=repo_id, full_name=f"owner/repo-{repo_id}", link=f"https://github.com/{repo_id}")
+                     for repo_id in (1, 2, 3)])
+    session.add_all([ChatRepo(chat_id=1, repo_id=1), ChatRepo(chat_id=2, repo_id=1), ChatRepo(chat_id=2, repo_id=2)])
+    session.add_all([Release(id=release_id, release_id=release_id, tag_name=f"v{release_id}",
+                             repo_id=release_id % 3 + 1,
+                             release_date=datetime(2026, 1, release_id, tzinfo=timezone.utc))
+                     for release_id in range(1, 6)])
+    session.commit()
+
+
+def table_counts(session):
+    return {model.__tablename__: session.query(model).count() for model in (Chat, Repo, ChatRepo, Release)}
+
+
+def test_counter_triggers_match_table_counts(migrated_database):
+    session = migrated_database.session
+    add_rows(session)
+    # Counts come from the counter rows, not from the COUNT fallback
+    assert session.query(func.sum(Counter.value)).filter(Counter.name == 'release').scalar() == 5
+    assert Counter.get_counts(session) == table_counts(session) == {'chat': 2, 'repo': 3, 'chat_repo': 3,
+                                                                    'release': 5}
+
+    # Bulk deletes of maintenance tasks fire the triggers too
+    assert tasks.delete_orphan_repos(session) == (1, 2)
+    session.execute(delete(ChatRepo).where(ChatRepo.chat_id == 2))
+    session.commit()
+    assert Counter.get_counts(session) == table_counts(session)
+    assert tasks.reconcile_counters(session) == {}
+
+
+def test_reconcile_counters_corrects_drift(migrated_database):
+    session = migrated_database.session
+    add_rows(session)
+    # Counter rows written off by hand, or by a trigger missing for a while
+    session.merge(Counter(name='release', slot=0, value=1))
+    session.merge(Counter(name='release', slot=3, value=7))
+    session.merge(Counter(name='chat', slot=0, value=0))
+    session.commit()
+
+    assert tasks.reconcile_counters(session) == {'release': -3, 'chat': 2}
+    assert Counter.get_counts(session) == table_counts(session)
+
+
+def test_reconcile_counters_without_triggers(database):
+    add_rows(database.session)
+
+    assert tasks.reconcile_counters(database.session) == {}
+    assert Counter.get_counts(database.session) == table_counts(database.session)
@@ -0,0 +1,113 @@
+import hashlib
+import hmac
+
+import pytest
+
+from app import app
+from app.models import Release, Repo
+from app.webhook_engine import parse_event, verify_signature
+
+SECRET = "webhook secret"
+BODY = b'{"zen": "Keep it logically awesome."}'
+SIGNATURE = "sha256=" + hmac.new(SECRET.encode(), BODY, hashlib.sha256).hexdigest()
+
+
+def release_payload(action, release_id=1, prerelease=False, draft=False):
+    return {
+        'action': action,
+        'release': {
+            'id': release_id,
+            'tag_name': f"v{release_id}",
+            'name': f"v{release_id}",
+            'html_url': f"https://github.com/owner/repo/releases/tag/v{release_id}",
+            'body': "Changes",
+            'draft': draft,
+            'prerelease': prerelease,
+            'created_at': "2026-01-01T00:00:00Z",
+            'published_at': "2026-01-01T00:00:00Z",
+        },
+    }
+
+
+@pytest.fixture
+def repo_obj(database):
+    repo_obj = Repo(id=1, full_name="owner/repo", link="https://github.com/owner/repo")
+    database.session.add(repo_obj)
+    database.session.commit()
+    return repo_obj
+
+
+def test_verify_signature():
+    assert verify_signature(SECRET, BODY, SIGNATURE)
+
+
+@pytest.mark.parametrize("secret,body,signature", [
+    (SECRET, BODY, None),
+    (SECRET, BODY, ""),
+    (SECRET, BODY, SIGNATURE.removeprefix("sha256=")),  # No prefix
+    (SECRET, BODY, SIGNATURE.replace("sha256=", "sha1=")),
+    (SECRET, BODY + b" ", SIGNATURE),  # Tampered body
+    ("other secret", BODY, SIGNATURE),
+    ("", BODY, "sha256=" + hmac.new(b"", BODY, hashlib.sha256).hexdigest()),  # Anyone can sign with empty secret
+])
+def test_verify_signature_rejects(secret, body, signature):
+    assert not verify_signature(secret, body, signature)
+
+
+@pytest.mark.parametrize("action", ["published", "released", "edited"])
+def test_parse_release_event(repo_obj, database, action):
+    if action == "edited":
+        # Only edits of the latest release are news
+        release_obj = Release(release_id=1, tag_name="v1", repo_id=repo_obj.id)
+        database.session.add(release_obj)
+        database.session.flush()
+        repo_obj.update_latest_release(release_obj)
+
+    snapshot = parse_event("release", release_payload(action), repo_obj)
+
+    assert snapshot.repo_id == repo_obj.id
+    assert snapshot.release.id == 1
+    assert snapshot.release.tag_name == "v1"
+    assert snapshot.prerelease is None
+
+
+def test_parse_release_event_skips_edits_of_older_releases(repo_obj, database):
+    release_obj = Release(release_id=2, tag_name="v2", repo_id=repo_obj.id)
+    database.session.add(release_obj)
+    database.session.flush()
+    repo_obj.update_latest_release(release_obj)
+
+    assert parse_event("release", release_payload("edited", release_id=1), repo_obj) is None
+
+
+def test_parse_release_event_skips_drafts(repo_obj):
+    assert parse_event("release", release_payload("published", draft=True), repo_obj) is None
+
+
+def test_parse_prerelease_event(repo_obj, monkeypatch):
+    payload = release_payload("prereleased", prerelease=True)
+
+    monkeypatch.setitem(app.config, 'PROCESS_PRE_RELEASES', False)
+    assert parse_event("release", payload, repo_obj) is None
+
+    monkeypatch.setitem(app.config, 'PROCESS_PRE_RELEASES', True)
+    snapshot = parse_event("release", payload, repo_obj)
+    assert snapshot.prerelease.id == 1
+    assert snapshot.release is None
+
+
+def test_parse_tag_event(repo_obj):
+    snapshot = parse_event("create", {'ref_type': "tag", 'ref': "v1.0"}, repo_obj)
+
+    assert snapshot.tag.name == "v1.0"
+    assert snapshot.release is None
+
+
+@pytest.mark.parametrize("event,payload", [
+    ("ping", {'zen': "Keep it logically awesome.", 'hook_id': 1}),
+    ("release", {'action': "deleted"}),
+    ("create", {'ref_type': "branch", 'ref': "main"}),
+    ("push", {'ref': "refs/heads/main"}),
+])
+def test_parse_event_ignores_other_events(repo_obj, event, payload):
+    assert parse_event(event, payload, repo_obj) is None